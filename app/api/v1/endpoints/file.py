@@ -207,7 +207,7 @@ def sync_file(
 #     """
 #     Experimental Endpoint: Creates and imports `csv_file` data into a hyper file.
 #     """
-#     process: HyperProcess = caches.get(HYPER_PROCESS_CACHE_KEY)
+#     process: HyperProcess = get_hyper_process_pool().acquire()
 #     suffix = Path(csv_file.filename).suffix
 #     csv_file.file.seek(0)
 #     file_path = f"{settings.media_path}/{id_string}.hyper"
@@ -1,13 +1,20 @@
 # Common Tags
-HYPER_PROCESS_CACHE_KEY = "HYPER_PROCESS"
-
 EVENT_STATUS_SUFFIX = "-event-status"
 HYPERFILE_SYNC_LOCK_PREFIX = "sync-hyperfile-"
+FORM_SCHEMA_CACHE_PREFIX = "form-schema-"
 
 ONADATA_TOKEN_ENDPOINT = "/o/token/"
 ONADATA_FORMS_ENDPOINT = "/api/v1/forms"
 ONADATA_USER_ENDPOINT = "/api/v1/user"
+ONADATA_DATA_ENDPOINT = "/api/v1/data"
+ONADATA_EXPORT_ENDPOINT = "/api/v1/export"
 
 SYNC_FAILURES_METADATA = "sync-failures"
 JOB_ID_METADATA = "job-id"
 FAILURE_REASON_METADATA = "failure-reason"
+LAST_SUBMISSION_ID_METADATA = "last-submission-id"
+LAST_DATE_MODIFIED_METADATA = "last-date-modified"
+FORM_STATE_METADATA = "form-state"
+EXPORT_DIGEST_METADATA = "export-digest"
+SYNC_RESULT_METADATA = "sync-result"
+EXPORT_JOB_METADATA = "export-job"
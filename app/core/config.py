@@ -1,6 +1,6 @@
 import os
-
-from typing import Any, List, Optional, Union
+from tempfile import gettempdir
+from typing import Any, Dict, List, Optional, Union
 from urllib.parse import quote_plus
 
 from cryptography.fernet import Fernet
@@ -90,6 +90,121 @@ class Settings(BaseSettings):
     # S3 Configurations
     S3_REGION: str = "eu-west-1"
     S3_BUCKET: str = "duva"
+    # Maximum number of bytes the Hyper files cached within MEDIA_ROOT
+    # may take up. The least recently used files are evicted first
+    MEDIA_CACHE_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+    # Whether a zstd compressed copy of Hyper files is stored in S3 & used
+    # by workers. Download links keep pointing to the uncompressed files.
+    # Requires zstandard i.e duva[zstd]
+    S3_COMPRESS_HYPER_FILES: bool = False
+    # zstd compression level of the compressed copies
+    S3_COMPRESSION_LEVEL: int = 3
+    # Size in bytes from which files are transferred to & from S3 in parts
+    S3_TRANSFER_THRESHOLD: int = 16 * 1024 * 1024
+    # Size in bytes of the parts files are transferred in
+    S3_TRANSFER_CHUNK_SIZE: int = 16 * 1024 * 1024
+    # Number of parts transferred concurrently
+    S3_TRANSFER_MAX_CONCURRENCY: int = 10
+    # Algorithm of the checksums S3 verifies uploads against & downloads are
+    # verified with i.e CRC32 or SHA256. Checksums aren't used when empty
+    S3_CHECKSUM_ALGORITHM: Optional[str] = "CRC32"
+
+    # Importer Configurations
+    # Number of CSV rows held in memory at a time while preparing an export
+    IMPORT_CHUNK_SIZE: int = 10000
+    # Whether exports should be cleaned up & re-written before being copied
+    # into Hyper. By default Hyper reads the downloaded export as is
+    IMPORT_REWRITE_CSV: bool = False
+    # Whether full exports should be inserted into Hyper while they're being
+    # downloaded. Only used when the column types are derived from the form
+    IMPORT_STREAM_EXPORTS: bool = False
+    # Number of downloaded chunks buffered while streaming an export
+    IMPORT_STREAM_BUFFER_CHUNKS: int = 64
+    # Whether exports should be converted to typed Parquet files with Arrow
+    # before being inserted into Hyper. Requires pyarrow i.e duva[arrow]
+    IMPORT_ARROW: bool = False
+    # Number of bytes Arrow reads from an export per batch & thread
+    IMPORT_ARROW_BLOCK_SIZE: int = 1024 * 1024 * 16
+    # Whether column types should be derived from the form's definition
+    # instead of the exported data
+    IMPORT_SCHEMA_FROM_FORM: bool = True
+    # Whether syncs should be skipped when the form's submissions, definition
+    # & export settings haven't changed since the last successful sync
+    IMPORT_SKIP_UNCHANGED_FORMS: bool = True
+    # Duration in seconds the field types of a form are cached for
+    FORM_SCHEMA_CACHE_TTL: int = 60 * 60 * 24 * 30
+    # Determines how a Hyper database is updated on sync. One of:
+    # - full: The database is re-created from a full export of the form
+    # - incremental: Submissions made since the last sync are appended
+    # - merge: Submissions added or edited since the last sync replace their
+    #          previous version & deleted submissions are removed
+    IMPORT_SYNC_MODE: str = "full"
+    # Whether syncs waiting on Onadata to build an export are re-scheduled
+    # to check on the export later instead of waiting for it within the job
+    IMPORT_DEFER_EXPORT_POLLING: bool = True
+    # Delay in seconds before an export in progress is checked on again.
+    # The delay doubles after every check up to EXPORT_POLL_MAX_INTERVAL
+    EXPORT_POLL_INTERVAL: int = 30
+    EXPORT_POLL_MAX_INTERVAL: int = 60 * 10
+    # Number of times an export in progress is checked on before the sync
+    # is considered failed
+    EXPORT_POLL_MAX_ATTEMPTS: int = 8
+    # Number of seconds before a scheduled sync the export it'll import is
+    # requested from Onadata. Exports aren't requested ahead of syncs when 0
+    EXPORT_PREWARM_LEAD_TIME: int = 60 * 5
+    # Whether full syncs reuse an existing Onadata export built with the same
+    # export settings after the form's data last changed
+    IMPORT_REUSE_EXPORTS: bool = True
+    # Whether full exports are shared by the syncs of HyperFiles tracking the
+    # same form with the same export settings
+    IMPORT_SHARE_EXPORTS: bool = True
+    # Directory shared exports are stored in & duration in seconds they're
+    # kept for
+    EXPORT_CACHE_ROOT: str = os.path.join(gettempdir(), "duva-exports")
+    EXPORT_CACHE_TTL: int = 60 * 30
+    # Maximum number of bytes shared exports may take up. The least recently
+    # cached exports are evicted first
+    EXPORT_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+
+    # Scratch Space Configurations
+    # Directory the files downloaded by jobs i.e CSV Exports are stored in
+    SCRATCH_ROOT: str = os.path.join(gettempdir(), "duva")
+    # Number of bytes jobs may use before new jobs have to wait for space
+    SCRATCH_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    # Duration in seconds a job waits for scratch space before failing
+    SCRATCH_WAIT_TIMEOUT: int = 60 * 10
+    # Optional tmpfs mount i.e /dev/shm small files are stored in
+    SCRATCH_TMPFS_ROOT: Optional[str] = None
+    # Maximum size in bytes of a file stored on tmpfs
+    SCRATCH_TMPFS_MAX_FILE_BYTES: int = 64 * 1024 * 1024
+
+    # HTTP Client Configurations
+    # Seconds to wait for a connection to an Onadata server
+    HTTP_CONNECT_TIMEOUT: float = 10
+    # Seconds to wait for data from an Onadata server
+    HTTP_READ_TIMEOUT: float = 120
+    # Number of connections kept alive per Onadata server
+    HTTP_POOL_SIZE: int = 10
+    # Number of times failed requests to Onadata are retried
+    HTTP_MAX_RETRIES: int = 3
+
+    # Hyper Process Configurations
+    # Maximum number of Hyper processes a worker keeps running
+    HYPER_PROCESS_POOL_SIZE: int = 1
+    # Number of imports a Hyper process serves before it's restarted
+    HYPER_PROCESS_MAX_JOBS: int = 100
+    # File format version of the Hyper databases created by the importer.
+    # Newer versions are smaller & faster but need newer Tableau releases to
+    # be read. Defaults to the version chosen by the Hyper API
+    HYPER_DATABASE_VERSION: Optional[int] = None
+    # Memory a Hyper process may use i.e 4g or 50%
+    HYPER_MEMORY_LIMIT: Optional[str] = None
+    # Directory Hyper processes write their logs to instead of the working
+    # directory of the worker
+    HYPER_LOG_DIR: Optional[str] = None
+    # Additional parameters Hyper processes are started with
+    # i.e {"log_file_max_count": "2"}
+    HYPER_PROCESS_PARAMETERS: Dict[str, str] = {}
 
     @field_validator("CORS_ALLOWED_ORIGINS", mode="before")
     def assemble_cors_origins(cls, v: Union[str, List[str]]) -> Union[List[str], str]:
@@ -7,3 +7,21 @@ Custom Duva exceptions module.
 
 class FailedExternalRequest(Exception):
     pass
+
+
+class IncompatibleSchema(Exception):
+    pass
+
+
+class ScratchSpaceUnavailable(Exception):
+    pass
+
+
+class ExportConversionError(Exception):
+    pass
+
+
+class ExportInProgress(Exception):
+    def __init__(self, job_uuid: str = None):
+        super().__init__(f"Export {job_uuid} is in progress")
+        self.job_uuid = job_uuid
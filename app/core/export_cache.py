@@ -0,0 +1,220 @@
+"""
+Host wide cache of downloaded Onadata CSV Exports.
+
+HyperFiles of different users may track the same form with the same export
+settings. Their syncs share a single download of the form's export, along
+with the columns derived from it, as long as the form's data hasn't changed
+since the export was downloaded. Entries are keyed on the server, form,
+export settings & form data version; users still have to be able to
+retrieve the form from Onadata before an entry is used on their behalf.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from tableauhyperapi import Name, SqlType, TableDefinition
+
+from app.core.config import settings
+from app.core.schema import SQL_TYPE_FACTORIES
+
+logger = logging.getLogger("export_cache")
+
+COLUMNS_SUFFIX = ".columns.json"
+LOCK_SUFFIX = ".lock"
+
+
+def link_or_copy(source: Path, destination: Path):
+    """
+    Hard links `source` to `destination`, copying it when both paths are on
+    different file systems
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+class ExportCache:
+    def __init__(self, root: str = None, ttl: int = None, max_bytes: int = None):
+        self.root = Path(root or settings.EXPORT_CACHE_ROOT)
+        self.ttl = settings.EXPORT_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = (
+            settings.EXPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        )
+
+    @staticmethod
+    def get_key(
+        server_id: int, form_id: int, export_settings: Optional[dict], version: dict
+    ) -> str:
+        """
+        Returns the key of the export of a form's data `version` exported
+        with `export_settings`
+        """
+        return hashlib.sha256(
+            json.dumps(
+                [server_id, form_id, export_settings, version], sort_keys=True
+            ).encode()
+        ).hexdigest()
+
+    def _export_path(self, key: str) -> Path:
+        return self.root / f"{key}.csv"
+
+    def _columns_path(self, key: str) -> Path:
+        return self.root / f"{key}{COLUMNS_SUFFIX}"
+
+    def _lock_path(self, key: str) -> Path:
+        return self.root / f"{key}{LOCK_SUFFIX}"
+
+    @staticmethod
+    def _is_current_lock(lock_file, lock_path: Path) -> bool:
+        # Lock files removed by `evict` while being waited on are replaced
+        try:
+            return os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """
+        Holds an exclusive lock on an entry. Syncs of the same export wait on
+        each other so the export is only downloaded once
+        """
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = self._lock_path(key)
+        while True:
+            with open(lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self._is_current_lock(lock_file, lock_path):
+                    continue
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                return
+
+    def _is_fresh(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime < self.ttl
+        except FileNotFoundError:
+            return False
+
+    def get(self, key: str, destination: Path) -> bool:
+        """
+        Places the cached export at `destination`. Returns whether the
+        export was cached
+        """
+        export_path = self._export_path(key)
+        if not self._is_fresh(export_path):
+            return False
+        try:
+            link_or_copy(export_path, destination)
+        except FileNotFoundError:
+            # Evicted by another sync
+            return False
+        logger.info(f"Using cached export {key}")
+        return True
+
+    def put(self, key: str, export_path: Path):
+        """
+        Caches the export downloaded to `export_path`
+        """
+        os.makedirs(self.root, exist_ok=True)
+        cached_path = self._export_path(key)
+        tmp_path = cached_path.with_suffix(".tmp")
+        link_or_copy(export_path, tmp_path)
+        # Entries are kept for `ttl` from the time they're cached
+        os.utime(tmp_path)
+        os.replace(tmp_path, cached_path)
+        self._columns_path(key).unlink(missing_ok=True)
+        self.evict(keep=key)
+
+    def get_columns(self, key: str) -> Optional[List[TableDefinition.Column]]:
+        """
+        Returns the columns derived from the cached export
+        """
+        columns_path = self._columns_path(key)
+        if not self._is_fresh(self._export_path(key)) or not columns_path.exists():
+            return None
+        return [
+            TableDefinition.Column(Name(name), getattr(SqlType, sql_type)())
+            for name, sql_type in json.loads(columns_path.read_text())
+        ]
+
+    def set_columns(self, key: str, columns: List[TableDefinition.Column]):
+        if not self._export_path(key).exists():
+            return
+        self._columns_path(key).write_text(
+            json.dumps(
+                [
+                    [
+                        column.name.unescaped,
+                        SQL_TYPE_FACTORIES.get(column.type, SqlType.text).__name__,
+                    ]
+                    for column in columns
+                ]
+            )
+        )
+
+    def _remove(self, export_path: Path):
+        logger.info(f"Evicting {export_path} from the export cache")
+        export_path.unlink(missing_ok=True)
+        self._columns_path(export_path.stem).unlink(missing_ok=True)
+
+    def _remove_lock(self, lock_path: Path):
+        """
+        Removes a lock file unless the lock is held
+        """
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if self._is_current_lock(lock_file, lock_path):
+                lock_path.unlink()
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Removes entries older than `ttl` & the least recently cached entries
+        until the cache fits within `max_bytes`, along with the lock files of
+        entries that are no longer cached. The `keep` entry is never evicted
+        """
+        if not self.root.is_dir():
+            return
+        exports = []
+        for path in self.root.glob("*.csv"):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if time.time() - mtime < self.ttl:
+                exports.append((mtime, path))
+            else:
+                self._remove(path)
+
+        total = sum(_file_size(path) for _, path in exports)
+        for _, path in sorted(exports):
+            if total <= self.max_bytes:
+                break
+            if path.stem == keep:
+                continue
+            total -= _file_size(path)
+            self._remove(path)
+
+        for lock_path in self.root.glob(f"*{LOCK_SUFFIX}"):
+            if not self._export_path(lock_path.stem).exists():
+                self._remove_lock(lock_path)
@@ -0,0 +1,126 @@
+"""
+Process wide registry of pooled HTTP clients used to talk to Onadata servers.
+
+Clients are created once per server & OS process and keep connections to the
+server alive between requests. Every request is bound by connect & read
+timeouts so that an unresponsive server can't hold a worker until the job
+times out. Authorization headers are passed per request & cookies are never
+stored; clients are shared by all users of a server.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.core.config import settings
+
+logger = logging.getLogger("http")
+
+_sessions: Dict[Tuple[int, str], requests.Session] = {}
+_clients: Dict[Tuple[int, str], httpx.Client] = {}
+_lock = threading.Lock()
+
+
+def _no_cookies_policy() -> DefaultCookiePolicy:
+    """
+    Cookie policy rejecting every cookie; cookies set by a server in response
+    to one user's request would otherwise be sent with other users' requests
+    """
+    return DefaultCookiePolicy(allowed_domains=[])
+
+
+class TimeoutSession(requests.Session):
+    """
+    requests Session applying a default timeout to every request
+    """
+
+    def __init__(self, timeout: Tuple[float, float]):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+def _create_session() -> requests.Session:
+    retry = Retry(
+        total=settings.HTTP_MAX_RETRIES,
+        read=settings.HTTP_MAX_RETRIES,
+        connect=settings.HTTP_MAX_RETRIES,
+        backoff_factor=1.1,
+        status_forcelist=[500, 502, 503, 504],
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=settings.HTTP_POOL_SIZE,
+        pool_maxsize=settings.HTTP_POOL_SIZE,
+    )
+    session = TimeoutSession(
+        timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+    )
+    session.cookies.set_policy(_no_cookies_policy())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _create_client() -> httpx.Client:
+    return httpx.Client(
+        timeout=httpx.Timeout(
+            settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_POOL_SIZE,
+            max_keepalive_connections=settings.HTTP_POOL_SIZE,
+        ),
+        follow_redirects=True,
+        cookies=CookieJar(policy=_no_cookies_policy()),
+    )
+
+
+def get_session(base_url: str) -> requests.Session:
+    """
+    Returns the pooled session used for API requests to `base_url`
+    """
+    key = (os.getpid(), base_url)
+    with _lock:
+        if key not in _sessions:
+            logger.info(f"Creating HTTP session for {base_url}")
+            _sessions[key] = _create_session()
+        return _sessions[key]
+
+
+def get_download_client(base_url: str) -> httpx.Client:
+    """
+    Returns the pooled client used to stream downloads i.e exports
+    from `base_url`
+    """
+    key = (os.getpid(), base_url)
+    with _lock:
+        if key not in _clients:
+            logger.info(f"Creating HTTP download client for {base_url}")
+            _clients[key] = _create_client()
+        return _clients[key]
+
+
+def close_clients():
+    """
+    Closes the clients created by the current OS process
+    """
+    pid = os.getpid()
+    with _lock:
+        for registry in [_sessions, _clients]:
+            for key in [key for key in registry if key[0] == pid]:
+                registry.pop(key).close()
+
+
+atexit.register(close_clients)
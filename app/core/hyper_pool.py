@@ -0,0 +1,162 @@
+"""
+Worker scoped pool of long-lived Hyper processes.
+
+Starting a Hyper server takes a couple of seconds and a burst of memory.
+Importers lease an already running process from the pool instead; processes
+are health checked before being leased and restarted after serving
+`max_jobs` imports or whenever they're found to have crashed.
+
+The pool belongs to the OS process that created it. Forked processes
+i.e RQ work horses get a pool of their own, so workers should run jobs
+in-process (`rq worker -w rq.SimpleWorker`) to benefit from the pool.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from tableauhyperapi import Connection, HyperException, HyperProcess, Telemetry
+
+from app.core.config import settings
+
+logger = logging.getLogger("hyper_pool")
+
+_pool: Optional["HyperProcessPool"] = None
+_pool_lock = threading.Lock()
+
+
+def get_hyper_process_parameters() -> Dict[str, str]:
+    """
+    Returns the parameters Hyper processes are started with
+    """
+    parameters = {}
+    if settings.HYPER_DATABASE_VERSION is not None:
+        parameters["default_database_version"] = str(settings.HYPER_DATABASE_VERSION)
+    if settings.HYPER_MEMORY_LIMIT:
+        parameters["memory_limit"] = settings.HYPER_MEMORY_LIMIT
+    if settings.HYPER_LOG_DIR:
+        # Hyper fails to start when its log directory doesn't exist
+        os.makedirs(settings.HYPER_LOG_DIR, exist_ok=True)
+        parameters["log_dir"] = settings.HYPER_LOG_DIR
+    parameters.update(settings.HYPER_PROCESS_PARAMETERS)
+    return parameters
+
+
+class HyperProcessPool:
+    """
+    Thread-safe pool of at most `size` Hyper processes
+    """
+
+    def __init__(self, size: int, max_jobs: int):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.pid = os.getpid()
+        self._idle: List[HyperProcess] = []
+        self._jobs: Dict[HyperProcess, int] = {}
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def _start_process() -> HyperProcess:
+        logger.info("Starting Hyper process")
+        return HyperProcess(
+            telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU,
+            parameters=get_hyper_process_parameters(),
+        )
+
+    @staticmethod
+    def is_healthy(process: HyperProcess) -> bool:
+        if not process.is_open:
+            return False
+        try:
+            with Connection(endpoint=process.endpoint) as connection:
+                connection.execute_scalar_query("SELECT 1")
+        except HyperException as e:
+            logger.warning(f"Hyper process {process.endpoint} is unhealthy: {e}")
+            return False
+        return True
+
+    def _discard(self, process: HyperProcess):
+        with self._condition:
+            self._jobs.pop(process, None)
+            self._condition.notify()
+        try:
+            process.close()
+        except HyperException as e:
+            logger.warning(f"Failed to stop Hyper process: {e}")
+
+    def acquire(self) -> HyperProcess:
+        """
+        Leases a healthy Hyper process, starting one if the pool isn't full.
+        Blocks until a process is released when all processes are leased
+        """
+        with self._condition:
+            while not self._idle and len(self._jobs) >= self.size:
+                self._condition.wait()
+            process = self._idle.pop() if self._idle else None
+            if process is None:
+                process = self._start_process()
+                self._jobs[process] = 0
+                return process
+
+        if self.is_healthy(process):
+            return process
+
+        logger.info("Restarting unhealthy Hyper process")
+        self._discard(process)
+        return self.acquire()
+
+    def release(self, process: HyperProcess):
+        """
+        Returns a leased process to the pool. Processes that have served
+        `max_jobs` imports or are no longer healthy are stopped
+        """
+        with self._condition:
+            jobs = self._jobs.get(process)
+            if jobs is not None:
+                self._jobs[process] = jobs + 1
+        if jobs is None:
+            return
+
+        if jobs + 1 >= self.max_jobs or not process.is_open:
+            logger.info(f"Recycling Hyper process after {jobs + 1} jobs")
+            self._discard(process)
+            return
+
+        with self._condition:
+            self._idle.append(process)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self) -> Iterator[HyperProcess]:
+        process = self.acquire()
+        try:
+            yield process
+        finally:
+            self.release(process)
+
+    def close(self):
+        """
+        Stops all idle processes
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for process in idle:
+            self._discard(process)
+
+
+def get_hyper_process_pool() -> HyperProcessPool:
+    """
+    Returns the Hyper process pool of the current OS process
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = HyperProcessPool(
+                size=settings.HYPER_PROCESS_POOL_SIZE,
+                max_jobs=settings.HYPER_PROCESS_MAX_JOBS,
+            )
+            atexit.register(_pool.close)
+        return _pool
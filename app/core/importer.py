@@ -1,76 +1,312 @@
 # Module containing the Importer class
 # Used to import CSV Data into a Hyper Database
+import csv
+import hashlib
+import io
 import logging
 import os
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List
+from tempfile import NamedTemporaryFile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import httpx
 import pandas as pd
+import redis
 from pandas.errors import EmptyDataError
-from requests.exceptions import RetryError
+from pyxform.errors import PyXFormError
+from requests.exceptions import RequestException
+from rq import get_current_job
 from sqlalchemy.orm.session import Session
 from tableauhyperapi import (
     Connection,
     CreateMode,
     HyperException,
-    HyperProcess,
+    Inserter,
     Name,
+    Persistence,
     SqlType,
     TableDefinition,
     TableName,
-    Telemetry,
+    Timestamp,
     escape_string_literal,
 )
 
 from app import crud
-from app.common_tags import JOB_ID_METADATA, SYNC_FAILURES_METADATA
-from app.core.exceptions import FailedExternalRequest
-from app.core.onadata import OnaDataAPIClient
+from app.common_tags import (
+    EXPORT_DIGEST_METADATA,
+    EXPORT_JOB_METADATA,
+    FORM_STATE_METADATA,
+    JOB_ID_METADATA,
+    LAST_DATE_MODIFIED_METADATA,
+    LAST_SUBMISSION_ID_METADATA,
+    SYNC_FAILURES_METADATA,
+    SYNC_RESULT_METADATA,
+)
+from app.core.config import settings
+from app.core.exceptions import (
+    ExportConversionError,
+    ExportInProgress,
+    FailedExternalRequest,
+    IncompatibleSchema,
+    ScratchSpaceUnavailable,
+)
+from app.core.export_cache import ExportCache
+from app.core.hyper_pool import get_hyper_process_pool
+from app.core.onadata import OnaDataAPIClient, parse_onadata_datetime
+from app.core.parquet import arrow_available, csv_to_parquet, infer_csv_column_types
+from app.core.schema import (
+    SUBMISSION_META_SQL_TYPES,
+    FormSchemaCache,
+    get_form_columns,
+    get_form_field_types,
+    pandas_type_to_hyper_sql_type,
+    sql_type_name,
+    widen_column_type,
+    widen_sql_type,
+)
+from app.core.scratch import ScratchJob, ScratchSpace
 from app.core.security import fernet_decrypt
 from app.database.session import SessionLocal
-from app.jobs.scheduler import schedule_cron_job
+from app.jobs.scheduler import (
+    get_next_cron_time,
+    is_job_pending,
+    schedule_cron_job,
+    schedule_delayed_job,
+)
 from app.models import HyperFile
-from app.schemas import FileStatusEnum
+from app.schemas import FileStatusEnum, SyncModeEnum, SyncResultEnum
 
 logger = logging.getLogger("importer")
 
 
-def _pandas_type_to_hyper_sql_type(_type: str) -> SqlType:
-    # Only supports text and numeric fields, more may be added later
-    type_map = {  # noqa
-        "b": SqlType.text,
-        "i": SqlType.big_int,
-        "u": SqlType.text,
-        "f": SqlType.double,
-        "c": SqlType.text,
-        "O": SqlType.text,
-        "S": SqlType.text,
-        "a": SqlType.text,
-        "U": SqlType.text,
+# Meta data fields used to track the last synced submission for sync modes
+# that only import the submissions that changed since the previous sync
+SYNC_MODE_MARKS = {
+    SyncModeEnum.incremental: LAST_SUBMISSION_ID_METADATA,
+    SyncModeEnum.merge: LAST_DATE_MODIFIED_METADATA,
+}
+# Submission field & Onadata query operator used to filter exports
+# against a sync mode's mark
+SYNC_MODE_QUERIES = {
+    SyncModeEnum.incremental: ("_id", "$gt"),
+    SyncModeEnum.merge: ("_date_modified", "$gt"),
+}
+
+# Fields of an Onadata form that change whenever its submissions or
+# definition change
+FORM_STATE_FIELDS = ["num_of_submissions", "last_submission_time", "date_modified"]
+# Values used by Onadata to represent missing data within CSV Exports
+CSV_NA_VALUES = ["n/a", ""]
+
+
+def _infer_csv_column_types(
+    csv_path: Path, chunksize: int = settings.IMPORT_CHUNK_SIZE
+) -> Dict[str, Callable]:
+    """
+    Derives the Hyper SQL type of every column in an Onadata CSV Export
+
+    The export is read in chunks of `chunksize` rows and each column's type
+    is widened as the chunks are read i.e big_int -> double -> text. Memory
+    usage is therefore bound by the chunk size and not the size of the export.
+    """
+    column_types: Dict[str, Optional[Callable]] = {}
+    rows = 0
+    with pd.read_csv(csv_path, na_values=CSV_NA_VALUES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            rows += len(chunk)
+            chunk = chunk.convert_dtypes()
+            for name, dtype in chunk.dtypes.items():
+                column_types.setdefault(name, None)
+                # Chunks without values for a column say nothing of its type
+                if chunk[name].isna().all():
+                    continue
+                column_types[name] = widen_sql_type(
+                    column_types[name], pandas_type_to_hyper_sql_type(dtype.kind)
+                )
+    # Columns without any values are typed the same way pandas types them
+    empty_column_type = SqlType.big_int if rows else SqlType.text
+    return {
+        name: SUBMISSION_META_SQL_TYPES.get(name, sql_type or empty_column_type)
+        for name, sql_type in column_types.items()
     }
-    return type_map.get(_type)
 
 
-def _prep_csv_for_import(csv_path: Path) -> List[TableDefinition.Column]:
+def _csv_columns(
+    csv_path: Path, chunksize: int = settings.IMPORT_CHUNK_SIZE
+) -> List[TableDefinition.Column]:
     """
     Creates a schema definition from an Onadata CSV Export
-    DISCLAIMER: This function doesn't actually try to derive the columns
-    type. It returns every column as a string column
-    """
-    columns: List[SqlType] = []
-    df = pd.read_csv(csv_path, na_values=["n/a", ""])
-    df = df.convert_dtypes()
-    for i, dtype in enumerate(df.dtypes):
-        column = TableDefinition.Column(
-            Name(df.dtypes.index[i]), _pandas_type_to_hyper_sql_type(dtype.kind)()
-        )
-        columns.append(column)
-    # Save dataframe to CSV as the dataframe is more cleaner
-    # in most cases. We also don't want the headers to be within
-    # the CSV as Hyper picks the header as a value
-    with open(csv_path, "w") as f:
-        f.truncate(0)
-    df.to_csv(csv_path, na_rep="NULL", header=True, index=False)
+    """
+    column_types = _infer_csv_column_types(csv_path, chunksize=chunksize)
+    return [
+        TableDefinition.Column(Name(name), sql_type())
+        for name, sql_type in column_types.items()
+    ]
+
+
+def _use_arrow() -> bool:
+    """
+    Returns whether exports should be read with Arrow
+    """
+    if not settings.IMPORT_ARROW or settings.IMPORT_REWRITE_CSV:
+        return False
+    if not arrow_available():
+        logger.warning("IMPORT_ARROW is enabled but pyarrow isn't installed")
+        return False
+    return True
+
+
+def _read_csv_header(csv_path: Path) -> List[str]:
+    """
+    Returns the column names of an Onadata CSV Export
+    """
+    with open(csv_path, newline="") as csv_file:
+        header = next(csv.reader(csv_file), None)
+    if not header:
+        raise EmptyDataError("No columns to parse from file")
+    return header
+
+
+def _na_to_null(name: Name) -> str:
+    """
+    Returns an expression turning Onadata's missing-data values within the
+    `name` text column into NULLs
+    """
+    value = str(name)
+    for na_value in CSV_NA_VALUES:
+        value = f"NULLIF({value}, {escape_string_literal(na_value)})"
+    return value
+
+
+def _csv_insert_command(
+    table_name: TableName,
+    columns: List[TableDefinition.Column],
+    csv_path: Path,
+    delimiter: str = ",",
+) -> str:
+    """
+    Builds a command that inserts an Onadata CSV Export into `table_name`
+    as is. The export is read by Hyper through the `external` table function
+    with every column read as text; Onadata's missing-data values are turned
+    into NULLs and Hyper casts the remaining values to the column types on
+    insert.
+    """
+    descriptor = ", ".join(f"{column.name} TEXT" for column in columns)
+    values = [_na_to_null(column.name) for column in columns]
+    names = ", ".join(str(column.name) for column in columns)
+    return (
+        f"INSERT INTO {table_name} ({names}) SELECT {', '.join(values)} FROM external("
+        f"{escape_string_literal(str(csv_path))}, COLUMNS => DESCRIPTOR({descriptor}), "
+        f"FORMAT => 'csv', HEADER => true, DELIMITER => {escape_string_literal(delimiter)})"
+    )
+
+
+def _hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Returns the SHA-256 digest of the file at `path` without loading the
+    whole file into memory
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _BufferedChunks(io.RawIOBase):
+    """
+    Readable stream over the chunks of a download buffered by
+    `_buffer_chunks`
+    """
+
+    def __init__(self, buffer: queue.Queue):
+        self.buffer = buffer
+        self.pending = b""
+        self.done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.pending and not self.done:
+            chunk = self.buffer.get()
+            if chunk is None:
+                self.done = True
+            elif isinstance(chunk, Exception):
+                raise chunk
+            else:
+                self.pending = chunk
+        size = min(len(b), len(self.pending))
+        b[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def _put_chunk(buffer: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _buffer_chunks(
+    chunks: Iterator[bytes], buffer: queue.Queue, digest, stop: threading.Event
+):
+    """
+    Downloads `chunks` into the bounded `buffer` until the download is done
+    or `stop` is set. The end of the download is marked by None or the
+    exception that interrupted it
+    """
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            if not _put_chunk(buffer, chunk, stop):
+                return
+    except Exception as e:
+        _put_chunk(buffer, e, stop)
+    else:
+        _put_chunk(buffer, None, stop)
+
+
+def _prep_csv_for_import(
+    csv_path: Path, chunksize: int = settings.IMPORT_CHUNK_SIZE
+) -> List[TableDefinition.Column]:
+    """
+    Creates a schema definition from an Onadata CSV Export and re-writes
+    the export in a format Hyper can `COPY` from.
+
+    The export is streamed twice in chunks of `chunksize` rows; the first
+    pass derives the column types while the second re-writes the export.
+    """
+    columns = _csv_columns(csv_path, chunksize=chunksize)
+    # Re-write the export as the dataframe is more cleaner in most cases.
+    # Text columns are read as is so that values within a chunk aren't
+    # coerced into a different representation from the rest of the column
+    text_columns = {
+        column.name.unescaped: str
+        for column in columns
+        if column.type == SqlType.text()
+    }
+    with NamedTemporaryFile(
+        "w", dir=csv_path.parent, suffix=".csv", delete=False
+    ) as prepped_csv:
+        with pd.read_csv(
+            csv_path,
+            na_values=CSV_NA_VALUES,
+            dtype=text_columns,
+            chunksize=chunksize,
+        ) as reader:
+            for index, chunk in enumerate(reader):
+                chunk.convert_dtypes().to_csv(
+                    prepped_csv, na_rep="NULL", header=index == 0, index=False
+                )
+    os.replace(prepped_csv.name, csv_path)
     return columns
 
 
@@ -100,8 +336,55 @@ def import_to_hyper(hyperfile_id: int, schedule_cron: bool = True):
     if schedule_cron and not hyperfile.meta_data.get(JOB_ID_METADATA):
         hyperfile = schedule_import_to_hyper_job(db, hyperfile)
 
+    if _has_pending_follow_up(hyperfile):
+        logger.info(f"Sync of Hyperfile {hyperfile_id} is waiting on an export")
+        return
+
     with Importer(hyperfile=hyperfile, db=db) as importer:
-        importer.import_csv()
+        # Deferred syncs are resumed by their own follow-up job
+        if importer.import_csv() is not None:
+            schedule_export_prewarm(hyperfile_id)
+
+
+def _has_pending_follow_up(hyperfile: HyperFile) -> bool:
+    """
+    Returns whether a deferred sync of the HyperFile is yet to check on the
+    export it's waiting on. Other runs of the sync are skipped until then;
+    they would otherwise request exports of their own
+    """
+    export_job = hyperfile.meta_data.get(EXPORT_JOB_METADATA) or {}
+    job_id = export_job.get("follow_up_job_id")
+    current_job = get_current_job()
+    if not job_id or (current_job and current_job.id == job_id):
+        return False
+    return is_job_pending(job_id)
+
+
+def schedule_export_prewarm(hyperfile_id: int):
+    """
+    Schedules the export of the next sync to be requested
+    `EXPORT_PREWARM_LEAD_TIME` seconds before the sync runs
+    """
+    if not settings.EXPORT_PREWARM_LEAD_TIME:
+        return
+    prewarm_time = get_next_cron_time() - timedelta(
+        seconds=settings.EXPORT_PREWARM_LEAD_TIME
+    )
+    delay = prewarm_time - datetime.now(timezone.utc)
+    if delay.total_seconds() > 0:
+        schedule_delayed_job(prewarm_export, [hyperfile_id], delay)
+
+
+def prewarm_export(hyperfile_id: int):
+    """
+    Requests the export the next sync of a HyperFile imports so that it's
+    ready by the time the sync runs
+    """
+    db = SessionLocal()
+    hyperfile = crud.hyperfile.get(db, id=hyperfile_id)
+    if not hyperfile or not hyperfile.is_active:
+        return
+    Importer(hyperfile=hyperfile, db=db).prewarm_export()
 
 
 class Importer:
@@ -109,101 +392,539 @@ class Importer:
     Class used to import CSV Data from Onadata into a Tableau Hyper database.
     """
 
-    def __init__(self, hyperfile: HyperFile, db: Session):
+    table_name = TableName("Extract", "Extract")
+
+    def __init__(
+        self, hyperfile: HyperFile, db: Session, redis_client: redis.Redis = None
+    ):
         self.hyperfile = hyperfile
         self.db = db
         self.unique_id = f"{self.hyperfile.id}-{self.hyperfile.filename}"
+        self.field_types: Optional[Dict[str, Callable]] = None
+        # Key of the shared export cache entry of the export being imported
+        self.export_cache_key: Optional[str] = None
+        if not redis_client:
+            redis_client = redis.from_url(
+                str(settings.REDIS_URL), socket_timeout=30, socket_connect_timeout=30
+            )
+        self.schema_cache = FormSchemaCache(redis_client)
 
     def __enter__(self):
         return self.start_import()
 
     def start_import(self):
-        self.process = HyperProcess(
-            telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU
-        )
+        self.process = get_hyper_process_pool().acquire()
         return self
 
-    def import_csv(self):
-        logger.info(f"{self.unique_id} - Importing CSV for Hyper File")
+    def _record_download_failure(self):
+        self.hyperfile.meta_data[SYNC_FAILURES_METADATA] = (
+            self.hyperfile.meta_data.get(SYNC_FAILURES_METADATA, 0) + 1
+        )
+        self.hyperfile = crud.hyperfile.update(
+            self.db,
+            db_obj=self.hyperfile,
+            obj_in={
+                "meta_data": self.hyperfile.meta_data,
+                "file_status": FileStatusEnum.latest_sync_failed,
+            },
+        )
 
-        self.hyperfile = crud.hyperfile.update_status(
-            self.db, obj=self.hyperfile, status=FileStatusEnum.syncing
+    def _record_sync_success(self, result: SyncResultEnum, meta_data: dict):
+        self.hyperfile = crud.hyperfile.update(
+            self.db,
+            db_obj=self.hyperfile,
+            obj_in={
+                "file_status": FileStatusEnum.file_available,
+                "meta_data": {
+                    **self.hyperfile.meta_data,
+                    **meta_data,
+                    SYNC_RESULT_METADATA: result.value,
+                    SYNC_FAILURES_METADATA: 0,
+                },
+            },
+        )
+
+    def _get_export_settings(self) -> Optional[dict]:
+        if self.hyperfile.configuration:
+            return self.hyperfile.configuration.export_settings
+        return None
+
+    def _pop_export_job(self, query: Optional[dict]) -> dict:
+        """
+        Returns the Onadata export job a previous run of the sync left in
+        progress if it was requested with the same query & export settings
+        """
+        meta_data = dict(self.hyperfile.meta_data)
+        export_job = meta_data.pop(EXPORT_JOB_METADATA, None) or {}
+        self.hyperfile.meta_data = meta_data
+        if export_job.get("query") != query:
+            return {}
+        if export_job.get("export_settings") != self._get_export_settings():
+            return {}
+        return export_job
+
+    def _record_export_job(
+        self,
+        job_uuid: Optional[str],
+        query: Optional[dict],
+        attempts: int,
+        form_state: Optional[dict] = None,
+        follow_up_job_id: Optional[str] = None,
+    ):
+        """
+        Records an Onadata export job in progress for the next sync to
+        check on instead of requesting a new export. `form_state` is the
+        state of the form when the export was requested; the export holds
+        none of the changes made to the form since
+        """
+        self.hyperfile = crud.hyperfile.update(
+            self.db,
+            db_obj=self.hyperfile,
+            obj_in={
+                "meta_data": {
+                    **self.hyperfile.meta_data,
+                    EXPORT_JOB_METADATA: {
+                        "job_uuid": job_uuid,
+                        "query": query,
+                        "export_settings": self._get_export_settings(),
+                        "attempts": attempts,
+                        "form_state": form_state,
+                        "follow_up_job_id": follow_up_job_id,
+                    },
+                }
+            },
         )
+
+    def _defer_import(
+        self,
+        job_uuid: Optional[str],
+        query: Optional[dict],
+        export_job: dict,
+        form_state: dict,
+    ):
+        """
+        Schedules a check on an export Onadata is still building. The delay
+        between checks doubles with every check
+        """
+        attempts = export_job.get("attempts", 0) + 1
+        if attempts > settings.EXPORT_POLL_MAX_ATTEMPTS:
+            logger.error(f"{self.unique_id} - Export {job_uuid} took too long")
+            self._record_download_failure()
+            return False
+
+        if job_uuid and export_job.get("job_uuid") == job_uuid:
+            form_state = export_job.get("form_state")
+        delay = min(
+            settings.EXPORT_POLL_INTERVAL * 2 ** (attempts - 1),
+            settings.EXPORT_POLL_MAX_INTERVAL,
+        )
+        job = schedule_delayed_job(
+            import_to_hyper, [self.hyperfile.id, False], timedelta(seconds=delay)
+        )
+        self._record_export_job(
+            job_uuid,
+            query,
+            attempts=attempts,
+            form_state=form_state,
+            follow_up_job_id=job.id,
+        )
+        logger.info(f"{self.unique_id} - Checking on export {job_uuid} in {delay}s")
+        return None
+
+    def prewarm_export(self):
+        """
+        Requests the export of the next sync from Onadata & records its
+        job_uuid for the sync to check on
+        """
+        if self._is_syncing():
+            logger.info(f"{self.unique_id} - Sync in progress")
+            return
+        if self.hyperfile.meta_data.get(EXPORT_JOB_METADATA):
+            logger.info(f"{self.unique_id} - Export already requested")
+            return
+
         client = OnaDataAPIClient(
             self.hyperfile.user.server.url,
             fernet_decrypt(self.hyperfile.user.access_token),
             user=self.hyperfile.user,
         )
-        logger.info(f"{self.unique_id} - Downloading Export")
+        form = self._get_form(client)
+        form_state = self._get_form_state(form) if form else None
+        if form_state and self._is_form_unchanged(form_state):
+            return
+
+        query = self._get_sync_query(self._get_sync_mode())
         try:
-            export_path = client.download_export(self.hyperfile)
-            logger.info(f"{self.unique_id} - Export downloaded")
-        except RetryError as e:
-            logger.info(f"{self.unique_id} - Retry Error: {e}")
-            self.hyperfile.meta_data[SYNC_FAILURES_METADATA] = (
-                self.hyperfile.meta_data.get(SYNC_FAILURES_METADATA, 0) + 1
-            )
-            self.hyperfile = crud.hyperfile.update(
-                self.db,
-                db_obj=self.hyperfile,
-                obj_in={
-                    "meta_data": self.hyperfile.meta_data,
-                    "file_status": FileStatusEnum.latest_sync_failed,
-                },
+            job_uuid = client.request_export(self.hyperfile, query=query)
+        except (FailedExternalRequest, RequestException, httpx.HTTPError) as e:
+            logger.info(f"{self.unique_id} - Failed to request export: {e}")
+            return
+        if not job_uuid:
+            return
+
+        logger.info(f"{self.unique_id} - Requested export {job_uuid} ahead of sync")
+        # Meta data is replaced as a whole; changes made by syncs that ran
+        # since the HyperFile was loaded would be lost otherwise
+        self.db.refresh(self.hyperfile)
+        if self._is_syncing() or self.hyperfile.meta_data.get(EXPORT_JOB_METADATA):
+            logger.info(f"{self.unique_id} - Sync started, export {job_uuid} unused")
+            return
+        self._record_export_job(job_uuid, query, attempts=0, form_state=form_state)
+
+    def _is_syncing(self) -> bool:
+        return self.hyperfile.file_status in [
+            FileStatusEnum.queued,
+            FileStatusEnum.syncing,
+        ]
+
+    def _get_form(self, client: OnaDataAPIClient) -> Optional[dict]:
+        try:
+            return client.get_form(self.hyperfile.form_id)
+        except (FailedExternalRequest, RequestException, httpx.HTTPError) as e:
+            logger.info(f"{self.unique_id} - Form unavailable: {e}")
+            return None
+
+    def _get_form_state(self, form: dict) -> dict:
+        """
+        Returns the values used to determine whether the form's export has
+        changed since the Hyper database was last synced
+        """
+        state = {field: form.get(field) for field in FORM_STATE_FIELDS}
+        state["export_settings"] = self._get_export_settings()
+        return state
+
+    def _is_form_unchanged(self, form_state: dict) -> bool:
+        if not settings.IMPORT_SKIP_UNCHANGED_FORMS:
+            return False
+        if self.hyperfile.file_status != FileStatusEnum.file_available:
+            return False
+        return self.hyperfile.meta_data.get(FORM_STATE_METADATA) == form_state
+
+    def _get_form_field_types(
+        self, client: OnaDataAPIClient, form: dict
+    ) -> Optional[Dict[str, Callable]]:
+        """
+        Returns the Hyper SQL types of the form's fields. The types are cached
+        per form version; the form definition is only retrieved & parsed when
+        the form has changed since the types were last derived
+        """
+        server_id = self.hyperfile.user.server_id
+        export_settings = self._get_export_settings()
+        try:
+            field_types = self.schema_cache.get(server_id, form, export_settings)
+            if field_types is None:
+                logger.info(f"{self.unique_id} - Deriving schema from form definition")
+                field_types = get_form_field_types(
+                    client.get_form_definition(form["formid"]), export_settings
+                )
+                self.schema_cache.set(server_id, form, field_types, export_settings)
+        except (
+            FailedExternalRequest,
+            RequestException,
+            httpx.HTTPError,
+            PyXFormError,
+        ) as e:
+            logger.info(
+                f"{self.unique_id} - Form definition unavailable: {e}. "
+                "Deriving schema from the export"
             )
+            return None
+        return field_types
+
+    def _get_sync_mode(self) -> SyncModeEnum:
+        """
+        Returns how the Hyper database should be updated. A full re-creation
+        is done whenever the sync mark required by the configured sync mode
+        isn't available
+        """
+        sync_mode = SyncModeEnum(settings.IMPORT_SYNC_MODE)
+        mark = SYNC_MODE_MARKS.get(sync_mode)
+        if not mark or self.hyperfile.meta_data.get(mark) is None:
+            return SyncModeEnum.full
+        return sync_mode
+
+    def _get_hyper_path(self, sync_mode: SyncModeEnum) -> Tuple[str, SyncModeEnum]:
+        """
+        Returns the path the Hyper database is built at & the sync mode to
+        build it with. Only incremental & merge syncs update the previous
+        database; it isn't downloaded for full syncs which re-create it
+        """
+        if sync_mode == SyncModeEnum.full:
+            return crud.hyperfile.get_local_path(obj=self.hyperfile), sync_mode
+
+        file_path = crud.hyperfile.get_latest_file(obj=self.hyperfile)
+        if not os.path.exists(file_path):
+            return file_path, SyncModeEnum.full
+        return file_path, sync_mode
+
+    def _get_sync_query(self, sync_mode: SyncModeEnum) -> Optional[dict]:
+        """
+        Returns the query used to only export submissions changed since
+        the last sync
+        """
+        if sync_mode == SyncModeEnum.full:
+            return None
+        mark = self.hyperfile.meta_data[SYNC_MODE_MARKS[sync_mode]]
+        field, operator = SYNC_MODE_QUERIES[sync_mode]
+        logger.info(f"{self.unique_id} - Syncing {sync_mode.value} from {mark}")
+        return {field: {operator: mark}}
+
+    def _can_stream_export(self, sync_mode: SyncModeEnum) -> bool:
+        """
+        Exports can only be streamed into Hyper when a full sync is done and
+        the column types are known before the export is downloaded
+        """
+        if not settings.IMPORT_STREAM_EXPORTS or settings.IMPORT_REWRITE_CSV:
             return False
-        except FailedExternalRequest as e:
-            logger.error(f"{self.unique_id} - CSV export download failed: {e}")
-            self.hyperfile.meta_data[SYNC_FAILURES_METADATA] = (
-                self.hyperfile.meta_data.get(SYNC_FAILURES_METADATA, 0) + 1
+        return sync_mode == SyncModeEnum.full and self.field_types is not None
+
+    def _find_fresh_export(
+        self, client: OnaDataAPIClient, form: Optional[dict]
+    ) -> Optional[str]:
+        """
+        Returns the URL of an existing export of the form that was built with
+        the same export settings after the form's data last changed
+        """
+        if not settings.IMPORT_REUSE_EXPORTS or not form:
+            return None
+        timestamps = [
+            parse_onadata_datetime(form.get(field))
+            for field in ["last_submission_time", "date_modified"]
+        ]
+        timestamps = [timestamp for timestamp in timestamps if timestamp]
+        if not timestamps:
+            return None
+        try:
+            return client.find_export(self.hyperfile, created_after=max(timestamps))
+        except (FailedExternalRequest, RequestException, httpx.HTTPError) as e:
+            logger.info(f"{self.unique_id} - Existing exports unavailable: {e}")
+            return None
+
+    def _download_export(
+        self,
+        client: OnaDataAPIClient,
+        form: Optional[dict],
+        sync_mode: SyncModeEnum,
+        query: Optional[dict],
+        job_uuid: Optional[str],
+        export_url: Optional[str],
+    ) -> Optional[Path]:
+        """
+        Downloads the export of the sync. Full exports are shared with the
+        syncs of other HyperFiles tracking the same form with the same export
+        settings. Only users the form was retrieved for, i.e users with access
+        to the form, use shared exports. Exports requested by previous runs,
+        i.e `job_uuid` exports, may predate the form's current data and
+        aren't shared
+        """
+        share = settings.IMPORT_SHARE_EXPORTS and form and client.scratch
+        if sync_mode != SyncModeEnum.full or not share or job_uuid:
+            return client.download_export(
+                self.hyperfile, query=query, job_uuid=job_uuid, export_url=export_url
             )
-            self.hyperfile = crud.hyperfile.update(
-                self.db,
-                db_obj=self.hyperfile,
-                obj_in={
-                    "meta_data": self.hyperfile.meta_data,
-                    "file_status": FileStatusEnum.latest_sync_failed,
-                },
+
+        cache = ExportCache()
+        key = cache.get_key(
+            self.hyperfile.user.server_id,
+            self.hyperfile.form_id,
+            self._get_export_settings(),
+            {field: form.get(field) for field in FORM_STATE_FIELDS},
+        )
+        with cache.lock(key):
+            shared_path = client.scratch.file_path(suffix=".csv")
+            if cache.get(key, shared_path):
+                self.export_cache_key = key
+                return shared_path
+
+            export_path = client.download_export(
+                self.hyperfile, query=query, job_uuid=job_uuid, export_url=export_url
+            )
+            if export_path:
+                cache.put(key, export_path)
+                self.export_cache_key = key
+            return export_path
+
+    def _build_hyper_file(
+        self,
+        client: OnaDataAPIClient,
+        hyper_path: str,
+        sync_mode: SyncModeEnum,
+        query: Optional[dict],
+        job_uuid: Optional[str] = None,
+        form: Optional[dict] = None,
+    ) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Exports the form & imports the export into the Hyper database.
+
+        Returns the number of imported rows along with the digest of full
+        exports. Downloaded full exports that are unchanged since the last
+        sync aren't imported.
+        """
+        self.export_cache_key = None
+        export_url = None
+        if sync_mode == SyncModeEnum.full and not job_uuid:
+            export_url = self._find_fresh_export(client, form)
+
+        if self._can_stream_export(sync_mode):
+            logger.info(f"{self.unique_id} - Streaming Export to Hyper")
+            with client.stream_export(
+                self.hyperfile, job_uuid=job_uuid, export_url=export_url
+            ) as chunks:
+                return self._stream_csv_to_hyper(hyper_path, chunks)
+
+        logger.info(f"{self.unique_id} - Downloading Export")
+        export_path = self._download_export(
+            client, form, sync_mode, query, job_uuid, export_url
+        )
+        logger.info(f"{self.unique_id} - Export downloaded")
+        if not export_path:
+            return None, None
+
+        export_digest = None
+        if sync_mode == SyncModeEnum.full:
+            export_digest = _hash_file(export_path)
+            if export_digest == self.hyperfile.meta_data.get(EXPORT_DIGEST_METADATA):
+                return None, export_digest
+
+        logger.info(f"{self.unique_id} - Importing CSV to Hyper")
+        if sync_mode == SyncModeEnum.incremental:
+            count = self._append_csv_to_hyper(
+                hyper_path=hyper_path, export_path=export_path
             )
+        elif sync_mode == SyncModeEnum.merge:
+            count = self._merge_csv_into_hyper(
+                hyper_path=hyper_path,
+                export_path=export_path,
+                submission_ids=client.iter_submission_ids(self.hyperfile.form_id),
+            )
+        else:
+            count = self._import_csv_to_hyper(
+                hyper_path=hyper_path, export_path=export_path
+            )
+        return count, export_digest
+
+    def import_csv(self, sync_mode: Optional[SyncModeEnum] = None):
+        """
+        Syncs the Hyper database with the form. Returns whether the sync
+        succeeded or None if it was deferred until Onadata builds the export
+        """
+        # Exports are removed once the import is done, whether it succeeded
+        # or not
+        with ScratchSpace().job(f"hyperfile-{self.hyperfile.id}") as scratch:
+            return self._import_csv(scratch, sync_mode=sync_mode)
+
+    def _import_csv(
+        self,
+        scratch: ScratchJob,
+        sync_mode: Optional[SyncModeEnum] = None,
+        infer_schema: bool = False,
+    ):
+        logger.info(f"{self.unique_id} - Importing CSV for Hyper File")
+
+        client = OnaDataAPIClient(
+            self.hyperfile.user.server.url,
+            fernet_decrypt(self.hyperfile.user.access_token),
+            user=self.hyperfile.user,
+            scratch=scratch,
+            wait_for_exports=not settings.IMPORT_DEFER_EXPORT_POLLING,
+        )
+        form = self._get_form(client)
+        form_state = {}
+        if form:
+            form_state = self._get_form_state(form)
+            if sync_mode is None and self._is_form_unchanged(form_state):
+                logger.info(f"{self.unique_id} - Form unchanged since last sync")
+                return True
+
+        self.hyperfile = crud.hyperfile.update_status(
+            self.db, obj=self.hyperfile, status=FileStatusEnum.syncing
+        )
+        self.field_types = None
+        if form and settings.IMPORT_SCHEMA_FROM_FORM and not infer_schema:
+            self.field_types = self._get_form_field_types(client, form)
+        file_path, sync_mode = self._get_hyper_path(sync_mode or self._get_sync_mode())
+        query = self._get_sync_query(sync_mode)
+        export_job = self._pop_export_job(query)
+        # Exports requested by previous runs hold none of the changes made
+        # to the form since; the form is synced again on the next run
+        exported_state = form_state
+        if export_job.get("job_uuid"):
+            exported_state = export_job.get("form_state") or {}
+
+        count = None
+        try:
+            count, export_digest = self._build_hyper_file(
+                client,
+                file_path,
+                sync_mode,
+                query,
+                job_uuid=export_job.get("job_uuid"),
+                form=form,
+            )
+        except ExportInProgress as e:
+            return self._defer_import(e.job_uuid, query, export_job, form_state)
+        except (RequestException, httpx.HTTPError) as e:
+            logger.info(f"{self.unique_id} - Request Error: {e}")
+            self._record_download_failure()
             return False
+        except (FailedExternalRequest, ScratchSpaceUnavailable) as e:
+            logger.error(f"{self.unique_id} - CSV export download failed: {e}")
+            self._record_download_failure()
+            return False
+        except IncompatibleSchema as e:
+            logger.info(f"{self.unique_id} - {e}. Re-creating HyperFile")
+            return self._import_csv(scratch, sync_mode=SyncModeEnum.full)
+        except (HyperException, csv.Error) as e:
+            if isinstance(e, HyperException) and self.field_types is not None:
+                # Submissions made before the form's questions changed type
+                # may hold values that don't fit the form's schema
+                logger.warning(
+                    f"{self.unique_id} - Export doesn't fit the form's schema: {e}. "
+                    "Deriving schema from the export"
+                )
+                return self._import_csv(scratch, sync_mode=sync_mode, infer_schema=True)
+            logger.error(f"{self.unique_id} - Creating HyperFile from CSV Failed: {e}")
+            exists = os.path.exists(file_path)
+            logger.error(f"{self.unique_id} - HyperFile: {file_path} - {exists}")
+        else:
+            if export_digest and export_digest == self.hyperfile.meta_data.get(
+                EXPORT_DIGEST_METADATA
+            ):
+                logger.info(f"{self.unique_id} - Export unchanged since last sync")
+                self._record_sync_success(
+                    SyncResultEnum.unchanged, {FORM_STATE_METADATA: exported_state}
+                )
+                return True
 
-        if export_path:
-            logger.info(f"{self.unique_id} - Importing CSV to Hyper")
-            file_path = crud.hyperfile.get_latest_file(obj=self.hyperfile)
-            try:
-                count = self._import_csv_to_hyper(
-                    hyper_path=file_path, export_path=export_path
+            if sync_mode != SyncModeEnum.full and not count:
+                logger.info(f"{self.unique_id} - No submission changes to import")
+                self._record_sync_success(
+                    SyncResultEnum.unchanged, {FORM_STATE_METADATA: exported_state}
                 )
-            except HyperException as e:
-                logger.error(
-                    f"{self.unique_id} - Creating HyperFile from CSV Failed: {e}"
+                return True
+
+            if count:
+                logger.info(f"{self.unique_id} - CSV imported to Hyper")
+                sync_marks = self._get_sync_marks(file_path)
+                # Update HyperFile
+                logger.info(f"{self.unique_id} - Syncing HyperFile to S3 and Tableau")
+                self.hyperfile = crud.hyperfile.sync_upstreams(
+                    db=self.db, obj=self.hyperfile
                 )
-                exists = os.path.exists(file_path)
-                logger.error(f"{self.unique_id} - HyperFile: {file_path} - {exists}")
-            else:
-                if count:
-                    logger.info(f"{self.unique_id} - CSV imported to Hyper")
-                    # Update HyperFile
-                    logger.info(
-                        f"{self.unique_id} - Syncing HyperFile to S3 and Tableau"
-                    )
-                    self.hyperfile = crud.hyperfile.sync_upstreams(
-                        db=self.db, obj=self.hyperfile
-                    )
-                    logger.info(
-                        f"{self.unique_id} - Synced HyperFile to S3 and Tableau"
-                    )
-                    self.hyperfile = crud.hyperfile.update(
-                        self.db,
-                        db_obj=self.hyperfile,
-                        obj_in={
-                            "file_status": FileStatusEnum.file_available,
-                            "meta_data": {SYNC_FAILURES_METADATA: 0},
-                        },
-                    )
-                    logger.info(f"{self.unique_id} - Imported and synced successfully")
+                logger.info(f"{self.unique_id} - Synced HyperFile to S3 and Tableau")
+                # Digests of partial exports don't represent the
+                # data within the Hyper database
+                self._record_sync_success(
+                    SyncResultEnum.updated,
+                    {
+                        **sync_marks,
+                        FORM_STATE_METADATA: exported_state,
+                        EXPORT_DIGEST_METADATA: export_digest,
+                    },
+                )
+                logger.info(f"{self.unique_id} - Imported and synced successfully")
 
-                    return True
+                return True
 
         logger.info(f"{self.unique_id} - CSV import failed - {count} records found.")
         meta_data = {}
@@ -224,6 +945,87 @@ class Importer:
 
         return False
 
+    def _insert_csv(
+        self,
+        connection: Connection,
+        columns: List[TableDefinition.Column],
+        export_path: Path,
+        null_field: str = "NULL",
+        delimiter: str = ",",
+        table_name: Optional[TableName] = None,
+    ) -> int:
+        table_name = table_name or self.table_name
+        if _use_arrow():
+            return self._insert_parquet(connection, columns, export_path, table_name)
+        if settings.IMPORT_REWRITE_CSV:
+            names = ", ".join(str(column.name) for column in columns)
+            command = (
+                f"COPY {table_name} ({names}) FROM "
+                f"{escape_string_literal(str(export_path))} WITH"
+                f"(format csv, NULL '{null_field}', delimiter '{delimiter}', header)"
+            )
+        else:
+            command = _csv_insert_command(
+                table_name, columns, export_path, delimiter=delimiter
+            )
+        return connection.execute_command(command=command)
+
+    def _insert_parquet(
+        self,
+        connection: Connection,
+        columns: List[TableDefinition.Column],
+        export_path: Path,
+        table_name: TableName,
+    ) -> int:
+        """
+        Converts the export to a typed Parquet file with Arrow & inserts it
+        into `table_name`
+        """
+        parquet_path = export_path.with_suffix(".parquet")
+        try:
+            csv_to_parquet(export_path, parquet_path, columns, CSV_NA_VALUES)
+            names = ", ".join(str(column.name) for column in columns)
+            return connection.execute_command(
+                f"INSERT INTO {table_name} ({names}) SELECT {names} FROM "
+                f"external({escape_string_literal(str(parquet_path))})"
+            )
+        except ExportConversionError as e:
+            # Hyper casts the values Arrow can't convert
+            logger.warning(f"{self.unique_id} - {e}. Reading the export with Hyper")
+            return connection.execute_command(
+                _csv_insert_command(table_name, columns, export_path)
+            )
+        finally:
+            parquet_path.unlink(missing_ok=True)
+
+    def _read_csv_columns(self, export_path: Path) -> List[TableDefinition.Column]:
+        if settings.IMPORT_REWRITE_CSV:
+            return _prep_csv_for_import(csv_path=export_path)
+
+        if self.field_types is not None:
+            return get_form_columns(self.field_types, _read_csv_header(export_path))
+        if not self.export_cache_key:
+            return self._infer_csv_columns(export_path)
+
+        # Columns derived from shared exports are shared as well
+        cache = ExportCache()
+        columns = cache.get_columns(self.export_cache_key)
+        if columns is None:
+            columns = self._infer_csv_columns(export_path)
+            cache.set_columns(self.export_cache_key, columns)
+        return columns
+
+    def _infer_csv_columns(self, export_path: Path) -> List[TableDefinition.Column]:
+        if _use_arrow():
+            column_types = infer_csv_column_types(
+                export_path, _read_csv_header(export_path), CSV_NA_VALUES
+            )
+            return [
+                TableDefinition.Column(Name(name), sql_type())
+                for name, sql_type in column_types.items()
+            ]
+        return _csv_columns(csv_path=export_path)
+
     def _import_csv_to_hyper(
         self,
         hyper_path: str,
@@ -231,9 +1033,8 @@ class Importer:
         null_field: str = "NULL",
         delimiter: str = ",",
     ):
-        table_name = TableName("Extract", "Extract")
         try:
-            columns = _prep_csv_for_import(csv_path=export_path)
+            columns = self._read_csv_columns(export_path)
         except EmptyDataError:
             # If the CSV is empty, we don't want to create a table
             # with no columns
@@ -245,18 +1046,290 @@ class Importer:
             create_mode=CreateMode.CREATE_AND_REPLACE,
         ) as connection:
             connection.catalog.create_schema("Extract")
-            extract_table = TableDefinition(table_name, columns=columns)
+            extract_table = TableDefinition(self.table_name, columns=columns)
             connection.catalog.create_table(extract_table)
 
-            command = (
-                f"COPY {table_name} FROM {escape_string_literal(str(export_path))} WITH"
-                f"(format csv, NULL '{null_field}', delimiter '{delimiter}', header)"
+            count = self._insert_csv(
+                connection,
+                columns,
+                export_path,
+                null_field=null_field,
+                delimiter=delimiter,
+            )
+            return count
+
+    def _stream_csv_to_hyper(
+        self, hyper_path: str, chunks: Iterator[bytes]
+    ) -> Tuple[Optional[int], str]:
+        """
+        Re-creates the Hyper database from a CSV Export while it's being
+        downloaded. The download runs on a separate thread & is buffered
+        in memory so that downloading & inserting overlap.
+
+        Returns the number of inserted rows & the digest of the export.
+        """
+        digest = hashlib.sha256()
+        buffer = queue.Queue(maxsize=settings.IMPORT_STREAM_BUFFER_CHUNKS)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=_buffer_chunks, args=(chunks, buffer, digest, stop), daemon=True
+        )
+        producer.start()
+        count = None
+        try:
+            rows = csv.reader(
+                io.TextIOWrapper(
+                    io.BufferedReader(_BufferedChunks(buffer)),
+                    encoding="utf-8",
+                    newline="",
+                )
             )
-            count = connection.execute_command(command=command)
+            header = next(rows, None)
+            if header:
+                columns = get_form_columns(self.field_types, header)
+                count = self._insert_rows_to_hyper(hyper_path, columns, rows)
+        finally:
+            stop.set()
+            producer.join()
+        return count, digest.hexdigest()
+
+    def _insert_rows_to_hyper(
+        self,
+        hyper_path: str,
+        columns: List[TableDefinition.Column],
+        rows: Iterator[List[str]],
+    ) -> int:
+        """
+        Re-creates the Extract table & inserts the CSV `rows` into it. Rows are
+        inserted as text; Hyper casts the values to the column types
+        """
+        with Connection(
+            endpoint=self.process.endpoint,
+            database=hyper_path,
+            create_mode=CreateMode.CREATE_AND_REPLACE,
+        ) as connection:
+            connection.catalog.create_schema("Extract")
+            extract_table = TableDefinition(self.table_name, columns=columns)
+            connection.catalog.create_table(extract_table)
+
+            column_mappings = [
+                Inserter.ColumnMapping(column.name, _na_to_null(column.name))
+                for column in columns
+            ]
+            text_columns = [
+                TableDefinition.Column(column.name, SqlType.text())
+                for column in columns
+            ]
+            count = 0
+            with Inserter(
+                connection,
+                extract_table,
+                column_mappings,
+                inserter_definition=text_columns,
+            ) as inserter:
+                for row in rows:
+                    if not row:
+                        continue
+                    if len(row) != len(columns):
+                        raise csv.Error(
+                            f"Row {count + 1} has {len(row)} values instead of "
+                            f"{len(columns)}"
+                        )
+                    inserter.add_row(row)
+                    count += 1
+                inserter.execute()
             return count
 
+    def _evolve_schema(
+        self, connection: Connection, columns: List[TableDefinition.Column]
+    ) -> TableDefinition:
+        """
+        Alters the existing Extract table so that `columns` can be inserted
+        into it and returns the table's definition.
+
+        Columns missing from the table are added while columns whose
+        type can't hold the incoming values are widened in place.
+        """
+        if not connection.catalog.has_table(self.table_name):
+            raise IncompatibleSchema(f"{self.table_name} does not exist")
+
+        table = connection.catalog.get_table_definition(self.table_name)
+        try:
+            for column in columns:
+                existing = table.get_column_by_name(column.name)
+                if not existing:
+                    logger.info(f"{self.unique_id} - Adding column {column.name}")
+                    connection.execute_command(
+                        f"ALTER TABLE {self.table_name} "
+                        f"ADD COLUMN {column.name} {sql_type_name(column.type)}"
+                    )
+                    continue
+
+                sql_type = widen_column_type(existing.type, column.type)
+                if sql_type != existing.type:
+                    logger.info(
+                        f"{self.unique_id} - Widening column {column.name} "
+                        f"from {existing.type} to {sql_type}"
+                    )
+                    self._widen_column(connection, existing, sql_type)
+        except HyperException as e:
+            raise IncompatibleSchema(f"{self.table_name} could not be altered: {e}")
+        return connection.catalog.get_table_definition(self.table_name)
+
+    def _widen_column(
+        self,
+        connection: Connection,
+        column: TableDefinition.Column,
+        sql_type: SqlType,
+    ):
+        """
+        Changes the type of `column` to `sql_type`.
+
+        Hyper doesn't support altering the type of a column so the values
+        are copied into a new column that replaces the existing one.
+        """
+        name = column.name
+        widened = Name(f"{name.unescaped}-widened")
+        type_name = sql_type_name(sql_type)
+        value = f"CAST({name} AS {type_name})"
+        if column.type == SqlType.bool():
+            # Keep the True/False values used within CSV Exports
+            value = f"CASE WHEN {name} THEN 'True' WHEN NOT {name} THEN 'False' END"
+        connection.execute_command(
+            f"ALTER TABLE {self.table_name} ADD COLUMN {widened} {type_name}"
+        )
+        connection.execute_command(f"UPDATE {self.table_name} SET {widened} = {value}")
+        connection.execute_command(f"ALTER TABLE {self.table_name} DROP COLUMN {name}")
+        connection.execute_command(
+            f"ALTER TABLE {self.table_name} RENAME COLUMN {widened} TO {name}"
+        )
+
+    def _append_csv_to_hyper(
+        self,
+        hyper_path: str,
+        export_path: Path,
+        null_field: str = "NULL",
+        delimiter: str = ",",
+    ):
+        """
+        Inserts the submissions within `export_path` into the existing
+        Extract table of the Hyper database
+        """
+        try:
+            columns = self._read_csv_columns(export_path)
+        except EmptyDataError:
+            return
+
+        with Connection(
+            endpoint=self.process.endpoint, database=hyper_path
+        ) as connection:
+            self._evolve_schema(connection, columns)
+            count = self._insert_csv(
+                connection,
+                columns,
+                export_path,
+                null_field=null_field,
+                delimiter=delimiter,
+            )
+            return count
+
+    def _merge_csv_into_hyper(
+        self,
+        hyper_path: str,
+        export_path: Path,
+        submission_ids: Iterable[List[int]],
+        null_field: str = "NULL",
+        delimiter: str = ",",
+    ) -> int:
+        """
+        Merges the added & edited submissions within `export_path` into the
+        existing Extract table of the Hyper database and removes the
+        submissions whose `_id` is not within `submission_ids`.
+
+        The changes are staged within temporary tables and applied in a
+        single transaction. Returns the number of rows inserted and deleted.
+        """
+        try:
+            columns = self._read_csv_columns(export_path)
+        except EmptyDataError:
+            columns = []
+
+        submission_id = Name("_id")
+        with Connection(
+            endpoint=self.process.endpoint, database=hyper_path
+        ) as connection:
+            table = self._evolve_schema(connection, columns)
+            if not table.get_column_by_name("_id"):
+                raise IncompatibleSchema(f"{self.table_name} has no _id column")
+
+            changes = TableDefinition(
+                TableName("Changes"),
+                columns=[table.get_column_by_name(column.name) for column in columns],
+                persistence=Persistence.TEMPORARY,
+            )
+            current = TableDefinition(
+                TableName("SubmissionIds"),
+                columns=[TableDefinition.Column(submission_id, SqlType.big_int())],
+                persistence=Persistence.TEMPORARY,
+            )
+            connection.catalog.create_table(current)
+            with Inserter(connection, current) as inserter:
+                for ids in submission_ids:
+                    inserter.add_rows([pk] for pk in ids)
+                inserter.execute()
+
+            count = 0
+            connection.execute_command("BEGIN TRANSACTION")
+            if columns:
+                connection.catalog.create_table(changes)
+                self._insert_csv(
+                    connection,
+                    columns,
+                    export_path,
+                    null_field=null_field,
+                    delimiter=delimiter,
+                    table_name=changes.table_name,
+                )
+                connection.execute_command(
+                    f"DELETE FROM {self.table_name} WHERE {submission_id} IN "
+                    f"(SELECT {submission_id} FROM {changes.table_name})"
+                )
+                names = ", ".join(str(column.name) for column in columns)
+                count += connection.execute_command(
+                    f"INSERT INTO {self.table_name} ({names}) "
+                    f"SELECT {names} FROM {changes.table_name}"
+                )
+            count += connection.execute_command(
+                f"DELETE FROM {self.table_name} WHERE {submission_id} NOT IN "
+                f"(SELECT {submission_id} FROM {current.table_name})"
+            )
+            connection.execute_command("COMMIT")
+            return count
+
+    def _get_sync_marks(self, hyper_path: str) -> dict:
+        """
+        Returns the marks used to determine which submissions have changed
+        since the Hyper database was last synced
+        """
+        sync_marks = {}
+        with Connection(
+            endpoint=self.process.endpoint, database=hyper_path
+        ) as connection:
+            table = connection.catalog.get_table_definition(self.table_name)
+            for sync_mode, mark in SYNC_MODE_MARKS.items():
+                field, _ = SYNC_MODE_QUERIES[sync_mode]
+                if not table.get_column_by_name(field):
+                    continue
+                value = connection.execute_scalar_query(
+                    f"SELECT MAX({Name(field)}) FROM {self.table_name}"
+                )
+                if isinstance(value, Timestamp):
+                    value = value.to_datetime().isoformat()
+                sync_marks[mark] = value
+        return sync_marks
+
     def __exit__(self, *args):
         self.stop_process()
 
     def stop_process(self):
-        self.process.close()
+        get_hyper_process_pool().release(self.process)
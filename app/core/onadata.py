@@ -1,48 +1,138 @@
+import json
 import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from time import sleep
-from urllib.parse import urljoin
+from typing import Iterator, List, Optional
+from urllib.parse import quote, urljoin
 
-import httpx
-import requests
+from dateutil.parser import isoparse
 from fastapi import HTTPException
-from requests.sessions import HTTPAdapter
-from urllib3.util.retry import Retry
 
 from app import crud, schemas
 from app.common_tags import (
+    ONADATA_DATA_ENDPOINT,
+    ONADATA_EXPORT_ENDPOINT,
     ONADATA_FORMS_ENDPOINT,
     ONADATA_TOKEN_ENDPOINT,
     ONADATA_USER_ENDPOINT,
 )
 from app.core.config import settings
-from app.core.exceptions import FailedExternalRequest
+from app.core.exceptions import ExportInProgress, FailedExternalRequest
+from app.core.http_clients import get_download_client, get_session
+from app.core.scratch import ScratchJob
 from app.core.security import fernet_decrypt
 from app.database.session import SessionLocal
 from app.models.hyperfile import HyperFile
 
 COMMON_HEADERS = {"User-Agent": f"{settings.APP_NAME}/{settings.APP_VERSION}"}
+# Export settings whose Onadata export option has a different name & meaning
+INVERTED_EXPORT_OPTIONS = {"do_not_split_select_multiple": "split_select_multiples"}
+# Export options Onadata applies when an export is requested without them
+ONADATA_DEFAULT_EXPORT_OPTIONS = {
+    "include_labels": False,
+    "remove_group_name": False,
+    "split_select_multiples": True,
+    "include_reviews": False,
+    "include_labels_only": False,
+    "value_select_multiples": False,
+    "show_choice_labels": False,
+    "binary_select_multiples": False,
+}
 
 logger = logging.getLogger("onadata")
 
 
-def write_export_to_temp_file(export_url, client, retry: int = 0):
+def parse_onadata_datetime(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parses a timestamp returned by Onadata. Timestamps without a timezone
+    are in UTC
+    """
+    if not value:
+        return None
+    parsed = isoparse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _export_options_match(options: dict, export_settings: dict) -> bool:
+    """
+    Returns whether an existing Onadata export was built with `export_settings`.
+    Exports requested without any export settings were built with
+    Onadata's defaults
+    """
+    if options.get("query"):
+        return False
+    for key, value in (export_settings or ONADATA_DEFAULT_EXPORT_OPTIONS).items():
+        if key in INVERTED_EXPORT_OPTIONS:
+            key, value = INVERTED_EXPORT_OPTIONS[key], not value
+        option = options.get(key, ONADATA_DEFAULT_EXPORT_OPTIONS.get(key))
+        if option is None or str(option).lower() != str(value).lower():
+            return False
+    return True
+
+
+def _is_reusable_export(
+    export: dict, export_settings: dict, created_after: datetime
+) -> bool:
+    """
+    Returns whether an existing Onadata export is a successful CSV Export
+    built with `export_settings` after `created_after`
+    """
+    if export.get("type") != "csv" or not export.get("export_url"):
+        return False
+    if export.get("job_status") not in ["Successful", "SUCCESS"]:
+        return False
+    if not _export_options_match(export.get("options") or {}, export_settings):
+        return False
+    date_created = parse_onadata_datetime(export.get("date_created"))
+    return date_created is not None and date_created > created_after
+
+
+def write_export_to_temp_file(
+    export_url,
+    client,
+    retry: int = 0,
+    scratch: Optional[ScratchJob] = None,
+    headers: Optional[dict] = None,
+):
     print("Writing to temporary CSV Export to temporary file.")
     retry = 0 or retry
     status = 0
-    with NamedTemporaryFile(delete=False, suffix=".csv") as export:
-        with client.stream("GET", export_url, follow_redirects=True) as response:
-            if response.status_code == 200:
+    with client.stream(
+        "GET", export_url, headers=headers, follow_redirects=True
+    ) as response:
+        if response.status_code == 200:
+            if scratch:
+                size_hint = response.headers.get("Content-Length")
+                export = open(
+                    scratch.file_path(
+                        suffix=".csv",
+                        size_hint=int(size_hint) if size_hint else None,
+                    ),
+                    "wb",
+                )
+            else:
+                export = NamedTemporaryFile(delete=False, suffix=".csv")
+            with export:
                 for chunk in response.iter_bytes():
                     export.write(chunk)
-                return export
-            status = response.status_code
+            return export
+        status = response.status_code
     if retry < 3:
         print(
             f"Retrying export write: Status {status}, Retry {retry}, URL {export_url}"
         )
-        write_export_to_temp_file(export_url=export_url, client=client, retry=retry + 1)
+        return write_export_to_temp_file(
+            export_url=export_url,
+            client=client,
+            retry=retry + 1,
+            scratch=scratch,
+            headers=headers,
+        )
 
 
 class OnaDataAPIClient:
@@ -55,27 +145,21 @@ class OnaDataAPIClient:
         base_url: str,
         access_token: str,
         user=None,
-        max_retries: int = 3,
-        back_off_factor: float = 1.1,
-        status_forcelist: list = [500, 502, 503, 504],
+        scratch: Optional[ScratchJob] = None,
+        wait_for_exports: bool = True,
     ):
-        retry = Retry(
-            total=max_retries,
-            read=max_retries,
-            connect=max_retries,
-            backoff_factor=back_off_factor,
-            status_forcelist=status_forcelist,
-        )
-        adapter = HTTPAdapter(max_retries=retry)
         self.base_url = base_url
         self.user = user
+        self.scratch = scratch
+        # Whether to poll exports in progress until they're ready instead of
+        # raising `ExportInProgress`
+        self.wait_for_exports = wait_for_exports
         self.unique_id = "api-client"
         if user:
             self.unique_id += f"-{user.username}"
 
-        self.client = requests.Session()
-        self.client.mount("https://", adapter)
-        self.client.mount("http://", adapter)
+        # Sessions are shared by all clients of the server
+        self.client = get_session(base_url)
         self.headers = self._get_headers(access_token)
 
     def _get_headers(self, access_token: str) -> dict:
@@ -90,10 +174,14 @@ class OnaDataAPIClient:
         headers.update(COMMON_HEADERS)
         return headers
 
-    def _download_export(
+    def _get_export_url(
         self, url, retries: int = 0, sleep_when_in_progress: bool = True
-    ):
-        logger.info(f"{self.unique_id} - Downloading export from {url}")
+    ) -> str:
+        """
+        Requests an export & waits for it to be ready. Returns the URL the
+        export can be downloaded from
+        """
+        logger.info(f"{self.unique_id} - Requesting export from {url}")
         resp = self.client.get(url, headers=self.headers)
         if resp.status_code == 202:
             resp = resp.json()
@@ -101,9 +189,8 @@ class OnaDataAPIClient:
 
             if resp.get("export_url") and status == "SUCCESS":
                 export_url = resp.get("export_url")
-                client = httpx.Client(headers=self.headers)
                 logger.info(f"{self.unique_id} - Export ready at {export_url}")
-                return write_export_to_temp_file(export_url, client, retry=3)
+                return export_url
 
             if status == "FAILURE":
                 logger.error(f"{self.unique_id} - Failed to export CSV\n{resp}")
@@ -111,14 +198,23 @@ class OnaDataAPIClient:
                     f"Failed to export CSV: {resp.get('progress')}"
                 )
 
-            if resp.get("job_uuid"):
-                url += f"&job_uuid={resp.get('job_uuid')}"
+            job_uuid = resp.get("job_uuid")
+            if not self.wait_for_exports:
+                logger.info(f"{self.unique_id} - Export {job_uuid} in progress")
+                raise ExportInProgress(job_uuid)
+
+            if job_uuid and "job_uuid=" not in url:
+                url += f"&job_uuid={job_uuid}"
 
             if retries < 3:
                 logger.info(f"{self.unique_id} - Export in progress. Retrying in a bit")
                 if sleep_when_in_progress:
                     sleep(30 * (retries + 1))
-                return self._download_export(url, retries=retries + 1)
+                return self._get_export_url(
+                    url,
+                    retries=retries + 1,
+                    sleep_when_in_progress=sleep_when_in_progress,
+                )
 
             logger.error(f"{self.unique_id} - Export took too long. Aborting")
             raise FailedExternalRequest(
@@ -128,7 +224,7 @@ class OnaDataAPIClient:
         if resp.status_code == 401:
             logger.info(f"{self.unique_id} - Access token expired. Refreshing")
             self.refresh_access_token()
-            return self._download_export(url)
+            return self._get_export_url(url)
 
         if resp.status_code == 404:
             logger.error(f"{self.unique_id} - Export not found (404) for {url}.")
@@ -143,23 +239,159 @@ class OnaDataAPIClient:
             f"Failed to export CSV. URL: {url}, status_code: {resp.status_code}"
         )
 
-    def download_export(self, hyperfile: HyperFile) -> Path:
-        self.user = hyperfile.user
+    def _download_export(self, url, sleep_when_in_progress: bool = True):
+        export_url = self._get_export_url(
+            url, sleep_when_in_progress=sleep_when_in_progress
+        )
+        return self._write_export(export_url)
+
+    def _write_export(self, export_url):
+        return write_export_to_temp_file(
+            export_url,
+            get_download_client(self.base_url),
+            retry=3,
+            scratch=self.scratch,
+            headers=self.headers,
+        )
+
+    def _get_export_settings(self, hyperfile: HyperFile) -> dict:
+        if not hyperfile.configuration:
+            return {}
+        return schemas.ExportConfigurationSettings(
+            **hyperfile.configuration.export_settings
+        ).dict()
+
+    def _get_export_request_url(
+        self,
+        hyperfile: HyperFile,
+        query: Optional[dict] = None,
+        job_uuid: Optional[str] = None,
+    ) -> str:
         export_url = urljoin(
             self.base_url,
             f"{ONADATA_FORMS_ENDPOINT}/{hyperfile.form_id}/export_async.json?format=csv",
         )
-        if hyperfile.configuration:
-            export_settings = schemas.ExportConfigurationSettings(
-                **hyperfile.configuration.export_settings
-            ).dict()
-            for key, value in export_settings.items():
-                export_url += f"&{key}={value}"
+        for key, value in self._get_export_settings(hyperfile).items():
+            export_url += f"&{key}={value}"
+        if query:
+            export_url += f"&query={quote(json.dumps(query))}"
+        if job_uuid:
+            export_url += f"&job_uuid={job_uuid}"
+        return export_url
+
+    def find_export(
+        self, hyperfile: HyperFile, created_after: datetime
+    ) -> Optional[str]:
+        """
+        Returns the URL of the latest successful CSV Export of the form linked
+        to `hyperfile` that was created after `created_after` with the
+        hyperfile's export settings
+        """
+        logger.info(f"{self.unique_id} - Listing exports of {hyperfile.form_id}")
+        resp = self.client.get(
+            url=urljoin(self.base_url, f"{ONADATA_EXPORT_ENDPOINT}.json"),
+            params={"xform": hyperfile.form_id},
+            headers=self.headers,
+        )
+
+        if resp.status_code == 401:
+            self.refresh_access_token()
+            return self.find_export(hyperfile, created_after)
+
+        if resp.status_code != 200:
+            logger.error(
+                f"{self.unique_id} - Failed to list exports {resp.status_code}"
+            )
+            raise FailedExternalRequest(resp.text)
+
+        export_settings = self._get_export_settings(hyperfile)
+        exports = [
+            export
+            for export in resp.json()
+            if _is_reusable_export(export, export_settings, created_after)
+        ]
+        if not exports:
+            return None
+        export = max(
+            exports, key=lambda export: parse_onadata_datetime(export["date_created"])
+        )
+        logger.info(f"{self.unique_id} - Reusing export {export.get('id')}")
+        return export["export_url"]
+
+    def download_export(
+        self,
+        hyperfile: HyperFile,
+        query: Optional[dict] = None,
+        job_uuid: Optional[str] = None,
+        export_url: Optional[str] = None,
+    ) -> Path:
+        """
+        Downloads a CSV Export of the form linked to `hyperfile`.
+
+        `query` is an optional Onadata data query used to filter the
+        submissions included in the export i.e `{"_id": {"$gt": 10}}`.
+        `job_uuid` identifies a previously requested export to check on
+        instead of requesting a new export. `export_url` is the URL of an
+        existing export to download as is
+        """
+        self.user = hyperfile.user
+        if export_url:
+            logger.info(f"{self.unique_id} - Downloading export {export_url}")
+            return Path(self._write_export(export_url).name)
+
+        export_url = self._get_export_request_url(
+            hyperfile, query=query, job_uuid=job_uuid
+        )
         logger.info(
             f"{self.unique_id} - Downloading export for {hyperfile.form_id} - {export_url}"
         )
         return Path(self._download_export(export_url).name)
 
+    def request_export(
+        self, hyperfile: HyperFile, query: Optional[dict] = None
+    ) -> Optional[str]:
+        """
+        Requests a CSV Export of the form linked to `hyperfile` without
+        waiting for it to be built. Returns the `job_uuid` of the export
+        while it's in progress
+        """
+        self.user = hyperfile.user
+        export_url = self._get_export_request_url(hyperfile, query=query)
+        wait_for_exports, self.wait_for_exports = self.wait_for_exports, False
+        try:
+            self._get_export_url(export_url)
+        except ExportInProgress as e:
+            return e.job_uuid
+        finally:
+            self.wait_for_exports = wait_for_exports
+        return None
+
+    @contextmanager
+    def stream_export(
+        self,
+        hyperfile: HyperFile,
+        query: Optional[dict] = None,
+        job_uuid: Optional[str] = None,
+        export_url: Optional[str] = None,
+    ) -> Iterator[Iterator[bytes]]:
+        """
+        Yields the chunks of a CSV Export of the form linked to `hyperfile`
+        as they're downloaded
+        """
+        self.user = hyperfile.user
+        export_url = export_url or self._get_export_url(
+            self._get_export_request_url(hyperfile, query=query, job_uuid=job_uuid)
+        )
+        logger.info(f"{self.unique_id} - Streaming export for {hyperfile.form_id}")
+        client = get_download_client(self.base_url)
+        with client.stream("GET", export_url, headers=self.headers) as response:
+            if response.status_code != 200:
+                raise FailedExternalRequest(
+                    f"Failed to stream CSV. URL: {export_url}, "
+                    f"status_code: {response.status_code}"
+                )
+            yield response.iter_bytes()
+
     def refresh_access_token(self):
         if not self.user:
             raise ValueError("User is required to refresh access token.")
@@ -191,6 +423,8 @@ class OnaDataAPIClient:
                     "refresh_token": data["refresh_token"],
                 },
             )
+            # Requests made after the refresh use the new access token
+            self.headers = self._get_headers(data["access_token"])
             logger.info(f"{self.unique_id} - Refreshed access token")
         else:
             if "invalid_grant" in resp.text:
@@ -252,3 +486,63 @@ class OnaDataAPIClient:
         logger.info(f"{self.unique_id} - Got form {form_id}")
 
         return resp.json()
+
+    def get_form_definition(self, form_id: int) -> dict:
+        """
+        Retrieves the JSON definition of a form i.e its questions & choices
+        """
+        logger.info(f"{self.unique_id} - Getting form definition {form_id}")
+        resp = self.client.get(
+            url=urljoin(self.base_url, f"{ONADATA_FORMS_ENDPOINT}/{form_id}/form.json"),
+            headers=self.headers,
+        )
+
+        if resp.status_code == 401:
+            self.refresh_access_token()
+            return self.get_form_definition(form_id)
+
+        if resp.status_code != 200:
+            logger.error(
+                f"{self.unique_id} - Failed to get form definition {resp.status_code}"
+            )
+            raise FailedExternalRequest(resp.text)
+
+        logger.info(f"{self.unique_id} - Got form definition {form_id}")
+
+        return resp.json()
+
+    def iter_submission_ids(
+        self, form_id: int, page_size: int = 10000
+    ) -> Iterator[List[int]]:
+        """
+        Yields pages of the `_id`s of every submission currently made to a form
+        """
+        page = 1
+        while True:
+            logger.info(f"{self.unique_id} - Getting submission ids page {page}")
+            resp = self.client.get(
+                url=urljoin(self.base_url, f"{ONADATA_DATA_ENDPOINT}/{form_id}.json"),
+                params={"fields": '["_id"]', "page": page, "page_size": page_size},
+                headers=self.headers,
+            )
+
+            if resp.status_code == 401:
+                self.refresh_access_token()
+                continue
+
+            if resp.status_code == 404 and page > 1:
+                # Onadata responds with a 404 once the last page has been read
+                return
+
+            if resp.status_code != 200:
+                logger.error(
+                    f"{self.unique_id} - Failed to get submission ids {resp.status_code}"
+                )
+                raise FailedExternalRequest(resp.text)
+
+            ids = [submission["_id"] for submission in resp.json()]
+            if ids:
+                yield ids
+            if len(ids) < page_size:
+                return
+            page += 1
@@ -0,0 +1,187 @@
+"""
+Optional Arrow based handling of CSV Exports.
+
+Exports are parsed by Arrow's multi-threaded CSV reader into typed batches
+that are written as Parquet files Hyper reads directly. Requires pyarrow
+i.e `pip install duva[arrow]`.
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from tableauhyperapi import SqlType, TableDefinition
+
+from app.core.config import settings
+from app.core.exceptions import ExportConversionError
+from app.core.schema import (
+    SUBMISSION_META_SQL_TYPES,
+    dedupe_column_names,
+    widen_sql_type,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+logger = logging.getLogger("parquet")
+
+# Values Arrow & pandas read as booleans
+BOOL_VALUES = ["True", "False", "true", "false", "TRUE", "FALSE"]
+# Matches timestamps with a zone offset. Hyper drops the offset of values
+# cast to naive timestamps while Arrow rejects them
+TIMESTAMP_OFFSET_REGEX = (
+    r"^(.*\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)(?:Z|[+-]\d{2}(?::?\d{2})?)$"
+)
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(sql_type: SqlType):
+    return {
+        SqlType.bool(): pa.bool_(),
+        SqlType.big_int(): pa.int64(),
+        SqlType.double(): pa.float64(),
+        SqlType.date(): pa.date32(),
+        SqlType.timestamp(): pa.timestamp("us"),
+        SqlType.timestamp_tz(): pa.timestamp("us", tz="UTC"),
+    }.get(sql_type, pa.string())
+
+
+def _drop_timestamp_offsets(array):
+    """
+    Casts the text values within `array` to naive timestamps; zone offsets
+    are dropped the same way Hyper drops them
+    """
+    values = pc.replace_substring_regex(
+        array, pattern=TIMESTAMP_OFFSET_REGEX, replacement=r"\1"
+    )
+    return pc.cast(values, pa.timestamp("us"))
+
+
+def _read_options(column_names: List[str]) -> "pa_csv.ReadOptions":
+    # The export's header is replaced by `column_names` as Arrow doesn't
+    # rename duplicate columns
+    return pa_csv.ReadOptions(
+        use_threads=True,
+        block_size=settings.IMPORT_ARROW_BLOCK_SIZE,
+        column_names=column_names,
+        skip_rows=1,
+    )
+
+
+def _array_sql_type(array) -> Optional[Callable]:
+    """
+    Returns the narrowest Hyper SQL type able to hold the text values
+    within `array` or None if the array only holds nulls
+    """
+    values = array.drop_null()
+    if not len(values):
+        return None
+    for sql_type in [SqlType.big_int, SqlType.double]:
+        try:
+            pc.cast(values, _arrow_type(sql_type()))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        return sql_type
+    if pc.all(pc.is_in(values, value_set=pa.array(BOOL_VALUES))).as_py():
+        return SqlType.bool
+    return SqlType.text
+
+
+def infer_csv_column_types(
+    csv_path: Path, header: List[str], na_values: List[str]
+) -> Dict[str, Callable]:
+    """
+    Derives the Hyper SQL type of every column in an Onadata CSV Export.
+
+    The export is read as text in batches & each column's type is widened
+    as the batches are read; the same way pandas based inference does
+    """
+    header = dedupe_column_names(header)
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in header},
+        null_values=na_values,
+        strings_can_be_null=True,
+    )
+    column_types: Dict[str, Optional[Callable]] = {name: None for name in header}
+    rows = 0
+    with pa_csv.open_csv(
+        csv_path, read_options=_read_options(header), convert_options=convert_options
+    ) as reader:
+        for batch in reader:
+            rows += batch.num_rows
+            for name, array in zip(batch.schema.names, batch.columns):
+                sql_type = _array_sql_type(array)
+                # Batches without values for a column say nothing of its type
+                if sql_type is not None:
+                    column_types[name] = widen_sql_type(column_types[name], sql_type)
+    empty_column_type = SqlType.big_int if rows else SqlType.text
+    return {
+        name: SUBMISSION_META_SQL_TYPES.get(name, sql_type or empty_column_type)
+        for name, sql_type in column_types.items()
+    }
+
+
+def csv_to_parquet(
+    csv_path: Path,
+    parquet_path: Path,
+    columns: List[TableDefinition.Column],
+    na_values: List[str],
+) -> int:
+    """
+    Converts an Onadata CSV Export to a Parquet file whose columns have the
+    Arrow types matching `columns`; the columns of the whole export in order.
+    Returns the number of converted rows. Raises ExportConversionError when
+    a value can't be converted to its column's type
+    """
+    column_names = [column.name.unescaped for column in columns]
+    schema = pa.schema(
+        [(column.name.unescaped, _arrow_type(column.type)) for column in columns]
+    )
+    # Naive timestamps are read as text so that zone offsets can be dropped
+    timestamp_columns = [
+        column.name.unescaped
+        for column in columns
+        if column.type == SqlType.timestamp()
+    ]
+    column_types = {field.name: field.type for field in schema}
+    column_types.update({name: pa.string() for name in timestamp_columns})
+    convert_options = pa_csv.ConvertOptions(
+        column_types=column_types,
+        null_values=na_values,
+        strings_can_be_null=True,
+        true_values=BOOL_VALUES[::2] + ["1"],
+        false_values=BOOL_VALUES[1::2] + ["0"],
+    )
+    rows = 0
+    try:
+        with pa_csv.open_csv(
+            csv_path,
+            read_options=_read_options(column_names),
+            convert_options=convert_options,
+        ) as reader:
+            with pq.ParquetWriter(parquet_path, schema) as writer:
+                for batch in reader:
+                    rows += batch.num_rows
+                    arrays = [
+                        (
+                            _drop_timestamp_offsets(array)
+                            if name in timestamp_columns
+                            else array
+                        )
+                        for name, array in zip(batch.schema.names, batch.columns)
+                    ]
+                    writer.write_batch(
+                        pa.RecordBatch.from_arrays(arrays, schema=schema)
+                    )
+    except pa.ArrowInvalid as e:
+        raise ExportConversionError(f"{csv_path} could not be converted: {e}")
+    logger.info(f"Converted {rows} rows of {csv_path} to Parquet")
+    return rows
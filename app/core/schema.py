@@ -0,0 +1,305 @@
+# Module containing helpers used to derive the schema of a Hyper database
+# from the definition of an Onadata form
+import hashlib
+import json
+import logging
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from pyxform.builder import create_survey_element_from_dict
+from pyxform.question import MultipleChoiceQuestion, Option, Question
+from redis import Redis
+from redis.exceptions import RedisError
+from tableauhyperapi import Name, SqlType, TableDefinition
+
+from app.common_tags import FORM_SCHEMA_CACHE_PREFIX
+from app.core.config import settings
+from app.schemas import ExportConfigurationSettings
+
+logger = logging.getLogger("schema")
+
+# Hyper SQL types of pandas dtype kinds
+PANDAS_KIND_SQL_TYPES = {
+    "b": SqlType.bool,
+    "i": SqlType.big_int,
+    "u": SqlType.text,
+    "f": SqlType.double,
+    "c": SqlType.text,
+    "O": SqlType.text,
+    "S": SqlType.text,
+    "a": SqlType.text,
+    "U": SqlType.text,
+}
+
+# Hyper SQL types of the XLSForm question types that aren't stored as text
+FORM_ELEMENT_SQL_TYPES = {
+    "integer": SqlType.big_int,
+    "decimal": SqlType.double,
+    "range": SqlType.double,
+    "date": SqlType.date,
+    "today": SqlType.date,
+    "dateTime": SqlType.timestamp_tz,
+    "start": SqlType.timestamp_tz,
+    "end": SqlType.timestamp_tz,
+}
+
+# Hyper SQL types of the submission meta data columns Onadata adds to
+# CSV Exports that aren't stored as text
+SUBMISSION_META_SQL_TYPES = {
+    "_id": SqlType.big_int,
+    "_xform_id": SqlType.big_int,
+    "_total_media": SqlType.big_int,
+    "_media_count": SqlType.big_int,
+    "_submission_time": SqlType.timestamp,
+    "_date_modified": SqlType.timestamp,
+}
+
+# Onadata splits the answers of geopoint questions into the columns
+# `_<question>_<component>` in addition to the question's column
+GEOPOINT_COMPONENTS = ["latitude", "longitude", "altitude", "precision"]
+GEOPOINT_COMPONENT_SQL_TYPE = SqlType.double
+
+# Numeric Hyper SQL types ordered from the narrowest to the widest
+NUMERIC_SQL_TYPES = [SqlType.big_int, SqlType.double]
+
+# Hyper SQL types used within Extracts & their names within SQL commands
+EXTRACT_SQL_TYPE_NAMES = {
+    SqlType.bool: "BOOL",
+    SqlType.big_int: "BIGINT",
+    SqlType.double: "DOUBLE PRECISION",
+    SqlType.date: "DATE",
+    SqlType.timestamp: "TIMESTAMP",
+    SqlType.timestamp_tz: "TIMESTAMPTZ",
+    SqlType.text: "TEXT",
+}
+SQL_TYPE_FACTORIES = {factory(): factory for factory in EXTRACT_SQL_TYPE_NAMES}
+
+REPEAT_INDEX_REGEX = re.compile(r"\[\d+\]")
+
+
+def pandas_type_to_hyper_sql_type(_type: str) -> Callable:
+    return PANDAS_KIND_SQL_TYPES.get(_type, SqlType.text)
+
+
+def element_type_to_hyper_sql_type(elem_type: str) -> Callable:
+    return FORM_ELEMENT_SQL_TYPES.get(elem_type, SqlType.text)
+
+
+def select_multiple_option_sql_type(export_settings: Optional[dict]) -> Callable:
+    """
+    Returns the Hyper SQL type of the split select multiple columns within
+    an export. The columns hold the selected choice's value when
+    `value_select_multiples` is set and whether the choice was selected
+    otherwise i.e True/False or 1/0 when `binary_select_multiples` is set
+    """
+    if export_settings is None:
+        return SqlType.bool
+    if ExportConfigurationSettings(**export_settings).value_select_multiples:
+        return SqlType.text
+    return SqlType.bool
+
+
+def widen_sql_type(current: Optional[Callable], new: Callable) -> Callable:
+    """
+    Returns the narrowest Hyper SQL type able to hold values of both
+    `current` and `new`. Mixed numeric types are widened to the wider
+    numeric type while any other mix is widened to text
+    """
+    if current is None or current is new:
+        return new
+    if current in NUMERIC_SQL_TYPES and new in NUMERIC_SQL_TYPES:
+        return max(current, new, key=NUMERIC_SQL_TYPES.index)
+    return SqlType.text
+
+
+def sql_type_name(sql_type: SqlType) -> str:
+    return EXTRACT_SQL_TYPE_NAMES[SQL_TYPE_FACTORIES.get(sql_type, SqlType.text)]
+
+
+def widen_column_type(current: SqlType, new: SqlType) -> SqlType:
+    """
+    Returns the narrowest Hyper SQL type able to hold values of both
+    the `current` & `new` column types
+    """
+    if current == new:
+        return current
+    return widen_sql_type(
+        SQL_TYPE_FACTORIES.get(current, SqlType.text),
+        SQL_TYPE_FACTORIES.get(new, SqlType.text),
+    )()
+
+
+def _element_keys(element, survey_name: str) -> List[str]:
+    """
+    Returns the values a CSV Export column for `element` may be named after
+    i.e the element's path, name & labels
+    """
+    path = element.get_xpath()[len(f"/{survey_name}/") :]
+    keys = [path, element.name]
+    labels = element.label if isinstance(element.label, dict) else {"": element.label}
+    keys.extend(label for label in labels.values() if label)
+    return keys
+
+
+def get_form_field_types(
+    form_definition: dict, export_settings: Optional[dict] = None
+) -> Dict[str, Callable]:
+    """
+    Maps the paths, names & labels of every question within an Onadata form
+    definition to the Hyper SQL type used to store the question's answers.
+
+    Keys shared by questions with different types are mapped to text.
+    """
+    survey = create_survey_element_from_dict(form_definition)
+    field_types: Dict[str, Callable] = {}
+
+    def add_field_type(key: str, sql_type: Callable):
+        if field_types.get(key, sql_type) is not sql_type:
+            sql_type = SqlType.text
+        field_types[key] = sql_type
+
+    for element in survey.iter_descendants():
+        if isinstance(element, Option):
+            if not isinstance(element.parent, MultipleChoiceQuestion):
+                continue
+            # Split select multiple columns are named after the question
+            # followed by the option i.e `fruits/apple`
+            sql_type = select_multiple_option_sql_type(export_settings)
+            for parent_key in _element_keys(element.parent, survey.name):
+                for key in _element_keys(element, survey.name)[1:]:
+                    add_field_type(f"{parent_key}/{key}", sql_type)
+        elif isinstance(element, Question):
+            keys = _element_keys(element, survey.name)
+            for key in keys:
+                add_field_type(key, element_type_to_hyper_sql_type(element.type))
+            if element.type == "geopoint":
+                for key in keys[:2]:
+                    for component in GEOPOINT_COMPONENTS:
+                        add_field_type(
+                            f"_{key}_{component}", GEOPOINT_COMPONENT_SQL_TYPE
+                        )
+    return field_types
+
+
+def get_column_sql_type(column: str, field_types: Dict[str, Callable]) -> Callable:
+    """
+    Returns the Hyper SQL type of a CSV Export column. Columns that can't
+    be matched to a question within the form are stored as text.
+    """
+    if column in SUBMISSION_META_SQL_TYPES:
+        return SUBMISSION_META_SQL_TYPES[column]
+
+    column = REPEAT_INDEX_REGEX.sub("", column)
+    if column in field_types:
+        return field_types[column]
+    # Group names may have been removed from the column name
+    return field_types.get(column.split("/")[-1], SqlType.text)
+
+
+def dedupe_column_names(header: List[str]) -> List[str]:
+    """
+    Renames the duplicate columns within the header of a CSV Export the same
+    way pandas does i.e `name`, `name.1`, `name.2`. Exports hold duplicate
+    columns whenever questions share a label or a name within different groups
+    """
+    counts: Dict[str, int] = defaultdict(int)
+    header_names = set(header)
+    names = []
+    for name in header:
+        column = name
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            column = f"{name}.{count}"
+            # Names already within the header aren't re-used
+            count = count + 1 if column in header_names else counts[column]
+        names.append(column)
+        counts[column] = count + 1
+    return names
+
+
+def get_form_columns(
+    field_types: Dict[str, Callable], header: List[str]
+) -> List[TableDefinition.Column]:
+    """
+    Creates a schema definition for an Onadata CSV Export with the columns
+    in `header` from the field types of the exported form.
+    """
+    return [
+        TableDefinition.Column(Name(name), get_column_sql_type(column, field_types)())
+        for name, column in zip(dedupe_column_names(header), header)
+    ]
+
+
+class FormSchemaCache:
+    """
+    Redis backed cache of the field types of Onadata forms.
+
+    Entries are stored per form and hold the version of the form they were
+    derived from; an entry is disregarded once the form is modified.
+    """
+
+    def __init__(
+        self, redis_client: Redis, timeout: int = settings.FORM_SCHEMA_CACHE_TTL
+    ):
+        self.redis_client = redis_client
+        self.timeout = timeout
+
+    @staticmethod
+    def _get_key(server_id: int, form_id: int, export_settings: Optional[dict]) -> str:
+        # Field types depend on the export settings used to export the form
+        settings_digest = hashlib.md5(
+            json.dumps(export_settings, sort_keys=True).encode()
+        ).hexdigest()
+        return f"{FORM_SCHEMA_CACHE_PREFIX}{server_id}-{form_id}-{settings_digest}"
+
+    @staticmethod
+    def _get_version(form: dict) -> str:
+        return f"{form.get('version')}-{form.get('hash')}"
+
+    def get(
+        self, server_id: int, form: dict, export_settings: Optional[dict] = None
+    ) -> Optional[Dict[str, Callable]]:
+        """
+        Returns the cached field types of `form` if they were derived from
+        the form's current version
+        """
+        key = self._get_key(server_id, form["formid"], export_settings)
+        try:
+            entry = self.redis_client.get(key)
+        except RedisError as e:
+            logger.error(f"Failed to retrieve cached form schema: {e}")
+            return None
+
+        if not entry:
+            return None
+        entry = json.loads(entry)
+        if entry["version"] != self._get_version(form):
+            return None
+        return {
+            key: getattr(SqlType, sql_type)
+            for key, sql_type in entry["field_types"].items()
+        }
+
+    def set(
+        self,
+        server_id: int,
+        form: dict,
+        field_types: Dict[str, Callable],
+        export_settings: Optional[dict] = None,
+    ):
+        entry = {
+            "version": self._get_version(form),
+            "field_types": {
+                key: sql_type.__name__ for key, sql_type in field_types.items()
+            },
+        }
+        try:
+            self.redis_client.setex(
+                self._get_key(server_id, form["formid"], export_settings),
+                self.timeout,
+                json.dumps(entry),
+            )
+        except RedisError as e:
+            logger.error(f"Failed to cache form schema: {e}")
@@ -0,0 +1,151 @@
+"""
+Managed scratch space for files only needed while a job runs i.e
+downloaded CSV Exports.
+
+Every job gets a directory of its own that's removed once the job is done,
+whether it succeeded or not. New jobs wait for space whenever the scratch
+space is using more than its byte budget. Small files can optionally be
+placed on a tmpfs mount.
+"""
+
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ScratchSpaceUnavailable
+
+logger = logging.getLogger("scratch")
+
+
+def _directory_size(path: Path) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return size
+
+
+class ScratchSpace:
+    def __init__(
+        self,
+        root: str = None,
+        max_bytes: int = None,
+        tmpfs_root: Optional[str] = None,
+        tmpfs_max_file_bytes: int = None,
+        wait_timeout: int = None,
+        poll_interval: float = 5,
+    ):
+        self.root = Path(root or settings.SCRATCH_ROOT)
+        self.max_bytes = settings.SCRATCH_MAX_BYTES if max_bytes is None else max_bytes
+        tmpfs_root = tmpfs_root or settings.SCRATCH_TMPFS_ROOT
+        # Jobs share the tmpfs mount with other applications
+        self.tmpfs_root = os.path.join(tmpfs_root, "duva") if tmpfs_root else None
+        self.tmpfs_max_file_bytes = (
+            settings.SCRATCH_TMPFS_MAX_FILE_BYTES
+            if tmpfs_max_file_bytes is None
+            else tmpfs_max_file_bytes
+        )
+        self.wait_timeout = (
+            settings.SCRATCH_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+        )
+        self.poll_interval = poll_interval
+
+    def usage(self) -> int:
+        """
+        Returns the number of bytes used by all jobs
+        """
+        return sum(
+            _directory_size(Path(root))
+            for root in [self.root, self.tmpfs_root]
+            if root and os.path.isdir(root)
+        )
+
+    def wait_for_space(self):
+        """
+        Blocks until the scratch space is within its byte budget. Raises
+        `ScratchSpaceUnavailable` if that doesn't happen within `wait_timeout`
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while (usage := self.usage()) >= self.max_bytes:
+            if time.monotonic() >= deadline:
+                raise ScratchSpaceUnavailable(
+                    f"Scratch space is using {usage} of {self.max_bytes} bytes"
+                )
+            logger.info(f"Waiting for scratch space: {usage}/{self.max_bytes} bytes")
+            time.sleep(self.poll_interval)
+
+    @contextmanager
+    def job(self, job_id: str) -> Iterator["ScratchJob"]:
+        """
+        Yields the scratch space of a job & removes its files on exit
+        """
+        scratch = ScratchJob(self, job_id)
+        try:
+            yield scratch
+        finally:
+            scratch.cleanup()
+
+
+class ScratchJob:
+    """
+    Scratch space of a single job. Directories are only created, and space
+    only waited for, once the job needs its first file
+    """
+
+    def __init__(self, space: ScratchSpace, job_id: str):
+        self.space = space
+        self.job_id = job_id
+        self.directories: List[Path] = []
+        self._file_count = 0
+        self._disk_dir: Optional[Path] = None
+        self._tmpfs_dir: Optional[Path] = None
+
+    def _make_dir(self, root: str) -> Path:
+        os.makedirs(root, exist_ok=True)
+        directory = Path(mkdtemp(prefix=f"{self.job_id}-", dir=root))
+        self.directories.append(directory)
+        return directory
+
+    def _fits_tmpfs(self, size_hint: Optional[int]) -> bool:
+        if not self.space.tmpfs_root or size_hint is None:
+            return False
+        if size_hint > self.space.tmpfs_max_file_bytes:
+            return False
+        os.makedirs(self.space.tmpfs_root, exist_ok=True)
+        return shutil.disk_usage(self.space.tmpfs_root).free > size_hint * 2
+
+    def file_path(self, suffix: str = "", size_hint: Optional[int] = None) -> Path:
+        """
+        Returns a new file path within the job's directory. Files expected to
+        hold at most `SCRATCH_TMPFS_MAX_FILE_BYTES` are placed on tmpfs
+        when it's configured
+        """
+        if not self.directories:
+            self.space.wait_for_space()
+
+        if self._fits_tmpfs(size_hint):
+            if not self._tmpfs_dir:
+                self._tmpfs_dir = self._make_dir(self.space.tmpfs_root)
+            directory = self._tmpfs_dir
+        else:
+            if not self._disk_dir:
+                self._disk_dir = self._make_dir(str(self.space.root))
+            directory = self._disk_dir
+
+        self._file_count += 1
+        return directory / f"{self._file_count}{suffix}"
+
+    def cleanup(self):
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.directories = []
+        self._disk_dir = self._tmpfs_dir = None
@@ -4,7 +4,6 @@ from typing import Any, Optional, Tuple, Union
 from urllib.parse import urljoin
 from uuid import uuid4
 
-import httpx
 import jwt
 from cryptography.fernet import Fernet
 from fastapi import Request
@@ -12,6 +11,7 @@ from passlib.context import CryptContext
 
 from app.common_tags import ONADATA_TOKEN_ENDPOINT
 from app.core.config import settings
+from app.core.http_clients import get_session
 from app.models.server import Server
 from app.schemas.user import User
 
@@ -57,7 +57,7 @@ def request_onadata_credentials(server: Server, code: str) -> Tuple[str, str]:
     Requests OnaData credentials using the provided code.
     """
     url = urljoin(server.url, ONADATA_TOKEN_ENDPOINT)
-    resp = httpx.post(
+    resp = get_session(server.url).post(
         url=url,
         data={
             "grant_type": "authorization_code",
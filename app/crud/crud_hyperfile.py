@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Union
 
@@ -8,7 +9,7 @@ from app.common_tags import JOB_ID_METADATA
 from app.core.config import settings
 from app.crud.base import CRUDBase
 from app.jobs.scheduler import cancel_job
-from app.libs.s3.client import S3Client
+from app.libs.s3 import S3Client, S3FileCache
 from app.libs.tableau.client import InvalidConfiguration, TableauClient
 from app.models.hyperfile import HyperFile
 from app.schemas.hyperfile import (
@@ -27,8 +28,7 @@ class CRUDHyperFile(
         if obj.meta_data.get(JOB_ID_METADATA):
             cancel_job(obj.meta_data.get(JOB_ID_METADATA))
 
-        s3_client = S3Client()
-        s3_client.delete(self.get_file_path(obj=obj))
+        S3FileCache().delete(self.get_file_path(obj=obj), self.get_local_path(obj=obj))
         return super().delete(db, id=id)
 
     def get_active(self, db: Session) -> List[HyperFile]:
@@ -48,8 +48,7 @@ class CRUDHyperFile(
 
     def get_latest_file(self, *, obj: HyperFile) -> str:
         local_path = self.get_local_path(obj=obj)
-        s3_client = S3Client()
-        s3_client.download(self.get_file_path(obj=obj), local_path)
+        S3FileCache().fetch(self.get_file_path(obj=obj), local_path)
         return local_path
 
     def update_status(
@@ -62,19 +61,31 @@ class CRUDHyperFile(
         return obj
 
     def sync_upstreams(self, db: Session, *, obj: HyperFile):
-        s3_client = S3Client()
-        s3_client.upload(self.get_local_path(obj=obj), self.get_file_path(obj=obj))
-        file_path = self.get_latest_file(obj=obj)
-
+        """
+        Uploads the locally built Hyper file to S3 & publishes it to Tableau.
+        Both uploads read the local file and run concurrently
+        """
+        file_path = self.get_local_path(obj=obj)
+        tableau_client = None
         if obj.configuration:
             tableau_client = TableauClient(configuration=obj.configuration)
             try:
                 tableau_client.validate_configuration(obj.configuration)
             except InvalidConfiguration as e:
                 sentry_sdk.capture_exception(e)
-                pass
-            else:
-                tableau_client.publish_hyper(file_path)
+                tableau_client = None
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            uploads = [
+                executor.submit(
+                    S3FileCache().store, file_path, self.get_file_path(obj=obj)
+                )
+            ]
+            if tableau_client:
+                uploads.append(executor.submit(tableau_client.publish_hyper, file_path))
+            for upload in uploads:
+                upload.result()
+
         obj.last_updated = datetime.utcnow()
         db.add(obj)
         db.commit()
@@ -1,10 +1,13 @@
 import os
+from datetime import datetime, timedelta
 from typing import Callable
 
 from redis import Redis
 from rq import Queue
-from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
 from rq_scheduler import Scheduler
+from rq_scheduler.utils import get_next_scheduled_time
 
 QUEUE_NAME = os.environ.get("QUEUE_NAME", "default")
 CRON_SCHEDULE = os.environ.get("CRON_SCHEDULE", "*/15 * * * *")
@@ -87,3 +90,43 @@ def schedule_cron_job(job_func: Callable, args_list) -> Job:
     )
     print(f"Job {job.id} scheduled ....")
     return job
+
+
+def schedule_delayed_job(job_func: Callable, args_list, delay: timedelta) -> Job:
+    """
+    Schedules a single run of job_func once `delay` has elapsed
+    """
+    job = SCHEDULER.enqueue_in(
+        delay,
+        job_func,
+        *args_list,
+        queue_name=QUEUE_NAME,
+        timeout=int(TASK_TIMEOUT),
+    )
+    print(f"Job {job.id} scheduled in {delay} ....")
+    return job
+
+
+def get_next_cron_time() -> datetime:
+    """
+    Returns the next time cron jobs run
+    """
+    return get_next_scheduled_time(CRON_SCHEDULE)
+
+
+def is_job_pending(job_id: str) -> bool:
+    """
+    Returns whether a job is yet to run or is running
+    """
+    if job_id in SCHEDULER:
+        return True
+    try:
+        job = Job.fetch(job_id, connection=REDIS_CONN)
+    except NoSuchJobError:
+        return False
+    return job.get_status() in [
+        JobStatus.SCHEDULED,
+        JobStatus.DEFERRED,
+        JobStatus.QUEUED,
+        JobStatus.STARTED,
+    ]
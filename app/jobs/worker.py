@@ -3,7 +3,7 @@ import os
 
 import sentry_sdk
 from redis import Redis
-from rq import Connection, Queue, Worker
+from rq import Connection, Queue, SimpleWorker
 from sentry_sdk.integrations.rq import RqIntegration
 
 from app.core.config import settings
@@ -28,5 +28,6 @@ with Connection():
 
     queue = Queue(QUEUE_NAME, connection=redis_conn)
 
-    w = Worker(queue, connection=redis_conn)
+    # Jobs are run in-process so that Hyper processes are reused across jobs
+    w = SimpleWorker(queue, connection=redis_conn)
     w.work()
@@ -1 +1,2 @@
 from .client import S3Client  # noqa
+from .cache import S3FileCache  # noqa
@@ -0,0 +1,174 @@
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.libs.s3.client import COMPRESSED_SUFFIX, S3Client, compression_available
+
+logger = logging.getLogger("s3_cache")
+
+ETAG_SUFFIX = ".etag"
+
+
+class S3FileCache:
+    """
+    Local cache of files stored in S3.
+
+    Cached files are validated against the S3 object's ETag before being
+    used and the least recently used files are evicted whenever the cache
+    grows beyond `max_bytes`. When `S3_COMPRESS_HYPER_FILES` is enabled the
+    cache transfers a zstd compressed copy of the files stored next to them
+    """
+
+    def __init__(
+        self,
+        root: str = None,
+        max_bytes: int = None,
+        s3_client: Optional[S3Client] = None,
+    ):
+        self.root = Path(root or settings.MEDIA_ROOT)
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else settings.MEDIA_CACHE_MAX_BYTES
+        )
+        self.s3_client = s3_client or S3Client()
+
+    @staticmethod
+    def _use_compression() -> bool:
+        if not settings.S3_COMPRESS_HYPER_FILES:
+            return False
+        if not compression_available():
+            logger.warning(
+                "S3_COMPRESS_HYPER_FILES is enabled but zstandard isn't installed"
+            )
+            return False
+        return True
+
+    def _remote_files(self, file_name: str) -> List[Tuple[str, bool]]:
+        """
+        Returns the S3 objects file_name can be fetched from, in order of
+        preference, and whether they're compressed
+        """
+        files = [(file_name, False)]
+        if self._use_compression():
+            # Files stored before compression was enabled have no compressed copy
+            files.insert(0, (f"{file_name}{COMPRESSED_SUFFIX}", True))
+        return files
+
+    @staticmethod
+    def _etag_path(local_path: str) -> Path:
+        return Path(f"{local_path}{ETAG_SUFFIX}")
+
+    def _get_cached_etag(self, local_path: str) -> Optional[str]:
+        """
+        Returns the ETag of the S3 object the local file was last synced
+        with. Files modified locally since then have no cached ETag
+        """
+        try:
+            etag, mtime = self._etag_path(local_path).read_text().split("\n")
+            if os.stat(local_path).st_mtime_ns != int(mtime):
+                return None
+        except (FileNotFoundError, ValueError):
+            return None
+        return etag
+
+    def _set_cached_etag(self, local_path: str, etag: Optional[str]):
+        etag_path = self._etag_path(local_path)
+        if etag:
+            etag_path.write_text(f"{etag}\n{os.stat(local_path).st_mtime_ns}")
+        else:
+            etag_path.unlink(missing_ok=True)
+
+    def _last_used(self, path: Path) -> float:
+        # The ETag file is touched whenever the cached file is used while
+        # the file itself is modified whenever it's re-built
+        last_used = path.stat().st_mtime
+        etag_path = self._etag_path(str(path))
+        if etag_path.exists():
+            return max(last_used, etag_path.stat().st_mtime)
+        return last_used
+
+    def fetch(self, file_name: str, local_path: str) -> bool:
+        """
+        Ensures `local_path` holds the current version of file_name in S3,
+        only downloading it when the cached copy is missing or stale.
+        Returns whether the file is available locally
+        """
+        for remote_name, compressed in self._remote_files(file_name):
+            etag = self.s3_client.get_etag(remote_name)
+            if etag:
+                break
+        else:
+            return False
+
+        if etag == self._get_cached_etag(local_path):
+            logger.info(f"Using cached copy of {file_name}")
+            os.utime(self._etag_path(local_path))
+            return True
+
+        download = (
+            self.s3_client.download_compressed
+            if compressed
+            else self.s3_client.download
+        )
+        if not download(local_path, remote_name):
+            return False
+
+        self._set_cached_etag(local_path, etag)
+        self.evict(keep=local_path)
+        return True
+
+    def store(self, local_path: str, file_name: str) -> bool:
+        """
+        Uploads `local_path` to S3 as file_name & marks the local copy as
+        the current version of the file
+        """
+        if not self.s3_client.upload(local_path, file_name):
+            self._set_cached_etag(local_path, None)
+            return False
+
+        remote_name, compressed = self._remote_files(file_name)[0]
+        if compressed:
+            stored = self.s3_client.upload_compressed(local_path, remote_name)
+        else:
+            # Compressed copies stored while compression was enabled would be
+            # fetched instead of the file once it's enabled again
+            stored = self.s3_client.delete(f"{file_name}{COMPRESSED_SUFFIX}")
+        if not stored:
+            if compressed:
+                self.s3_client.delete(remote_name)
+            self._set_cached_etag(local_path, None)
+            return False
+
+        self._set_cached_etag(local_path, self.s3_client.get_etag(remote_name))
+        self.evict(keep=local_path)
+        return True
+
+    def delete(self, file_name: str, local_path: str) -> bool:
+        """
+        Deletes file_name & its compressed copy from S3 along with the
+        cached copy
+        """
+        self.remove(local_path)
+        self.s3_client.delete(f"{file_name}{COMPRESSED_SUFFIX}")
+        return self.s3_client.delete(file_name)
+
+    def remove(self, local_path: str):
+        Path(local_path).unlink(missing_ok=True)
+        self._etag_path(local_path).unlink(missing_ok=True)
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Removes the least recently used files until the cache fits
+        within `max_bytes`. The `keep` file is never evicted
+        """
+        files = [path for path in self.root.glob("*.hyper") if path.is_file()]
+        total = sum(path.stat().st_size for path in files)
+        for path in sorted(files, key=self._last_used):
+            if total <= self.max_bytes:
+                break
+            if keep and path == Path(keep):
+                continue
+            logger.info(f"Evicting {path} from the cache")
+            total -= path.stat().st_size
+            self.remove(str(path))
@@ -1,8 +1,103 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
+from prometheus_client import Counter, Histogram
 
 from app.core.config import settings
 
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Suffix of the zstd compressed copies of files
+COMPRESSED_SUFFIX = ".zst"
+
+
+logger = logging.getLogger("s3")
+
+S3_TRANSFERRED_BYTES = Counter(
+    "s3_transferred_bytes",
+    "Number of bytes transferred to & from S3",
+    ["direction"],
+)
+S3_TRANSFER_DURATION = Histogram(
+    "s3_transfer_duration_seconds",
+    "Duration of transfers to & from S3",
+    ["direction"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+)
+
+# boto3 resources aren't thread-safe; every thread gets its own
+_local = threading.local()
+
+
+def compression_available() -> bool:
+    return zstandard is not None
+
+
+def get_s3_resource():
+    """
+    Returns the S3 resource of the current thread, creating it on first use
+    """
+    if getattr(_local, "s3", None) is None:
+        _local.s3 = boto3.session.Session().resource(
+            "s3", region_name=settings.S3_REGION
+        )
+    return _local.s3
+
+
+def get_transfer_config() -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=settings.S3_TRANSFER_THRESHOLD,
+        multipart_chunksize=settings.S3_TRANSFER_CHUNK_SIZE,
+        max_concurrency=settings.S3_TRANSFER_MAX_CONCURRENCY,
+    )
+
+
+@contextmanager
+def track_transfer(direction: str, file_name: str) -> Iterator[Callable[[int], None]]:
+    """
+    Yields a boto3 transfer callback recording the number of bytes
+    transferred & logs the throughput of the transfer once it's done
+    """
+    transferred = 0
+    lock = threading.Lock()
+
+    def callback(bytes_amount: int):
+        nonlocal transferred
+        with lock:
+            transferred += bytes_amount
+        S3_TRANSFERRED_BYTES.labels(direction).inc(bytes_amount)
+
+    start = time.monotonic()
+    yield callback
+    duration = time.monotonic() - start
+    S3_TRANSFER_DURATION.labels(direction).observe(duration)
+    logger.info(
+        f"{direction.capitalize()}ed {transferred} bytes of {file_name} in "
+        f"{duration:.2f}s ({transferred / max(duration, 1e-6) / 1024 ** 2:.2f} MiB/s)"
+    )
+
+
+def _upload_args() -> dict:
+    if settings.S3_CHECKSUM_ALGORITHM:
+        return {"ChecksumAlgorithm": settings.S3_CHECKSUM_ALGORITHM}
+    return {}
+
+
+def _download_args() -> dict:
+    if settings.S3_CHECKSUM_ALGORITHM:
+        return {"ChecksumMode": "ENABLED"}
+    return {}
+
 
 class S3Client:
     """
@@ -10,14 +105,24 @@ class S3Client:
 
     """
 
-    s3 = boto3.resource("s3", region_name=settings.S3_REGION)
+    @property
+    def s3(self):
+        return get_s3_resource()
 
     def upload(self, path, file_name):
         """
         uploads file in the given path to s3 with the given filename
         """
         try:
-            self.s3.meta.client.upload_file(path, settings.S3_BUCKET, file_name)
+            with track_transfer("upload", file_name) as callback:
+                self.s3.meta.client.upload_file(
+                    path,
+                    settings.S3_BUCKET,
+                    file_name,
+                    ExtraArgs=_upload_args(),
+                    Callback=callback,
+                    Config=get_transfer_config(),
+                )
         except ClientError:
             return False
         return True
@@ -27,11 +132,78 @@ class S3Client:
         Downloads file_name in s3 to path
         """
         try:
-            self.s3.meta.client.download_file(settings.S3_BUCKET, file_name, path)
+            with track_transfer("download", file_name) as callback:
+                self.s3.meta.client.download_file(
+                    settings.S3_BUCKET,
+                    file_name,
+                    path,
+                    ExtraArgs=_download_args(),
+                    Callback=callback,
+                    Config=get_transfer_config(),
+                )
         except ClientError:
             return False
         return True
 
+    def upload_compressed(self, path, file_name):
+        """
+        Compresses the file in the given path with zstd while uploading it
+        to s3 with the given filename
+        """
+        compressor = zstandard.ZstdCompressor(level=settings.S3_COMPRESSION_LEVEL)
+        try:
+            with open(path, "rb") as f, compressor.stream_reader(
+                f
+            ) as reader, track_transfer("upload", file_name) as callback:
+                self.s3.meta.client.upload_fileobj(
+                    reader,
+                    settings.S3_BUCKET,
+                    file_name,
+                    ExtraArgs=_upload_args(),
+                    Callback=callback,
+                    Config=get_transfer_config(),
+                )
+        except ClientError:
+            return False
+        return True
+
+    def download_compressed(self, path, file_name):
+        """
+        Downloads the zstd compressed file_name in s3 to path, decompressing
+        it as it's downloaded
+        """
+        part_path = f"{path}.part"
+        decompressor = zstandard.ZstdDecompressor()
+        try:
+            with open(part_path, "wb") as f, decompressor.stream_writer(
+                f, closefd=False
+            ) as writer, track_transfer("download", file_name) as callback:
+                self.s3.meta.client.download_fileobj(
+                    settings.S3_BUCKET,
+                    file_name,
+                    writer,
+                    ExtraArgs=_download_args(),
+                    Callback=callback,
+                    Config=get_transfer_config(),
+                )
+        except (ClientError, zstandard.ZstdError):
+            os.remove(part_path)
+            return False
+        os.replace(part_path, path)
+        return True
+
+    def get_etag(self, file_name):
+        """
+        Returns the ETag of file_name in s3 or None if it doesn't exist
+        """
+        try:
+            resp = self.s3.meta.client.head_object(
+                Bucket=settings.S3_BUCKET, Key=file_name
+            )
+        except ClientError:
+            return None
+        return resp.get("ETag")
+
     def delete(self, file_path):
         """
         Deletes file_path in S3
@@ -20,6 +20,8 @@ from .hyperfile import (  # noqa
     FileRequestBody,
     FileResponseBody,
     FileStatusEnum,
+    SyncModeEnum,
+    SyncResultEnum,
 )
 from .server import Server, ServerCreate, ServerResponse, ServerUpdate  # noqa
 from .token import Token, TokenPayload  # noqa
@@ -16,6 +16,17 @@ class FileStatusEnum(str, Enum):
     file_unavailable = "File unavailable"
 
 
+class SyncModeEnum(str, Enum):
+    full = "full"
+    incremental = "incremental"
+    merge = "merge"
+
+
+class SyncResultEnum(str, Enum):
+    updated = "updated"
+    unchanged = "unchanged"
+
+
 class FileBase(BaseModel):
     form_id: int
 
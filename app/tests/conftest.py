@@ -62,3 +62,49 @@ def create_user_and_login():
     # Clean up created objects
     crud.user.delete(db, id=user.id)
     crud.server.delete(db, id=server.id)
+
+
+@pytest.fixture
+def form_definition():
+    """
+    Definition of an Onadata form with questions of most types
+    """
+    return {
+        "name": "data",
+        "type": "survey",
+        "title": "Household Survey",
+        "id_string": "household_survey",
+        "default_language": "default",
+        "children": [
+            {"type": "text", "name": "name", "label": "Name"},
+            {"type": "integer", "name": "age", "label": {"English": "Age"}},
+            {"type": "date", "name": "visit_date", "label": "Visit Date"},
+            {"type": "geopoint", "name": "location", "label": "Location"},
+            {"type": "start", "name": "start"},
+            {
+                "type": "group",
+                "name": "measurements",
+                "label": "Measurements",
+                "children": [
+                    {"type": "decimal", "name": "height", "label": "Height"},
+                ],
+            },
+            {
+                "type": "repeat",
+                "name": "children",
+                "label": "Children",
+                "children": [
+                    {"type": "integer", "name": "child_age", "label": "Child Age"},
+                ],
+            },
+            {
+                "type": "select all that apply",
+                "name": "fruits",
+                "label": "Fruits",
+                "children": [
+                    {"name": "apple", "label": "Apple"},
+                    {"name": "pear", "label": "Pear"},
+                ],
+            },
+        ],
+    }
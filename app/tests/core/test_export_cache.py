@@ -0,0 +1,83 @@
+import os
+import time
+
+from tableauhyperapi import Name, SqlType, TableDefinition
+
+from app.core.export_cache import ExportCache
+
+
+class TestExportCache:
+    def test_exports_and_columns_are_shared(self, tmp_path):
+        cache = ExportCache(root=str(tmp_path / "cache"), ttl=60)
+        key = cache.get_key(1, 2, {"include_labels": True}, {"num": 4})
+        export_path = tmp_path / "export.csv"
+        export_path.write_text("_id\n1\n")
+        columns = [
+            TableDefinition.Column(Name("_id"), SqlType.big_int()),
+            TableDefinition.Column(Name("start"), SqlType.timestamp_tz()),
+        ]
+
+        assert not cache.get(key, tmp_path / "shared.csv")
+        cache.put(key, export_path)
+        cache.set_columns(key, columns)
+        assert cache.get(key, tmp_path / "shared.csv")
+        assert (tmp_path / "shared.csv").read_text() == "_id\n1\n"
+        assert [(c.name, c.type) for c in cache.get_columns(key)] == [
+            (c.name, c.type) for c in columns
+        ]
+        # Other data versions have entries of their own
+        assert cache.get_key(1, 2, {"include_labels": True}, {"num": 5}) != key
+
+    def test_stale_entries_are_evicted(self, tmp_path):
+        cache = ExportCache(root=str(tmp_path / "cache"), ttl=60)
+        export_path = tmp_path / "export.csv"
+        export_path.write_text("_id\n1\n")
+        cache.put("stale", export_path)
+        cache.set_columns("stale", [])
+        os.utime(cache.root / "stale.csv", (0, 0))
+
+        assert not cache.get("stale", tmp_path / "shared.csv")
+        fresh_path = tmp_path / "fresh.csv"
+        fresh_path.write_text("_id\n1\n")
+        cache.put("fresh", fresh_path)
+        assert [path.name for path in sorted(cache.root.glob("*.csv"))] == ["fresh.csv"]
+        assert not (cache.root / "stale.columns.json").exists()
+
+    def test_least_recently_cached_entries_are_evicted(self, tmp_path):
+        cache = ExportCache(root=str(tmp_path / "cache"), ttl=60, max_bytes=20)
+        for index in range(3):
+            export_path = tmp_path / f"{index}.csv"
+            export_path.write_text("_id\n1\n")
+            cache.put(str(index), export_path)
+            os.utime(cache.root / f"{index}.csv", (index, time.time() - 10 + index))
+
+        export_path = tmp_path / "3.csv"
+        export_path.write_text("_id\n1\n2\n3\n")
+        cache.put("3", export_path)
+
+        assert [path.name for path in sorted(cache.root.glob("*.csv"))] == [
+            "2.csv",
+            "3.csv",
+        ]
+
+    def test_lock_files_are_evicted(self, tmp_path):
+        cache = ExportCache(root=str(tmp_path / "cache"), ttl=60)
+        export_path = tmp_path / "export.csv"
+        export_path.write_text("_id\n1\n")
+        with cache.lock("cached"):
+            cache.put("cached", export_path)
+        with cache.lock("missing"):
+            pass
+
+        with cache.lock("held"):
+            cache.evict()
+            assert sorted(path.name for path in cache.root.glob("*.lock")) == [
+                "cached.lock",
+                "held.lock",
+            ]
+        cache.evict()
+        assert [path.name for path in cache.root.glob("*.lock")] == ["cached.lock"]
+
+        # Locks are still exclusive once their lock file is replaced
+        with cache.lock("held"):
+            assert (cache.root / "held.lock").exists()
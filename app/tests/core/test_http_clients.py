@@ -0,0 +1,66 @@
+from http.client import HTTPMessage
+from unittest.mock import MagicMock, patch
+
+import httpx
+import requests
+from requests.cookies import extract_cookies_to_jar
+
+from app.core import http_clients
+from app.core.config import settings
+
+
+class TestHTTPClients:
+    def teardown_method(self):
+        http_clients.close_clients()
+
+    def test_get_session(self):
+        session = http_clients.get_session("https://example.com")
+        assert http_clients.get_session("https://example.com") is session
+        assert http_clients.get_session("https://other.example.com") is not session
+        assert session.timeout == (
+            settings.HTTP_CONNECT_TIMEOUT,
+            settings.HTTP_READ_TIMEOUT,
+        )
+
+        # Sessions aren't shared with forked processes
+        with patch.object(http_clients.os, "getpid", return_value=-1):
+            assert http_clients.get_session("https://example.com") is not session
+            http_clients.close_clients()
+
+    def test_session_applies_default_timeout(self):
+        session = http_clients.get_session("https://example.com")
+        with patch("requests.Session.request") as mock_request:
+            session.get("https://example.com/api/v1/user")
+            session.get("https://example.com/api/v1/user", timeout=1)
+
+        assert mock_request.call_args_list[0][1]["timeout"] == session.timeout
+        assert mock_request.call_args_list[1][1]["timeout"] == 1
+
+    def test_close_clients(self):
+        session = http_clients.get_session("https://example.com")
+        client = http_clients.get_download_client("https://example.com")
+        assert http_clients.get_download_client("https://example.com") is client
+
+        http_clients.close_clients()
+
+        assert client.is_closed
+        assert http_clients.get_session("https://example.com") is not session
+        assert http_clients.get_download_client("https://example.com") is not client
+
+    def test_cookies_are_not_stored(self):
+        session = http_clients.get_session("https://example.com")
+        headers = HTTPMessage()
+        headers["Set-Cookie"] = "sessionid=abc; Path=/"
+        raw = MagicMock(_original_response=MagicMock(msg=headers))
+        request = requests.Request("GET", "https://example.com/").prepare()
+        extract_cookies_to_jar(session.cookies, request, raw)
+        assert not session.cookies
+
+        client = http_clients.get_download_client("https://example.com")
+        client._transport = httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, headers={"set-cookie": "sessionid=abc; Path=/"}
+            )
+        )
+        client.get("https://example.com/")
+        assert not list(client.cookies.jar)
@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core import hyper_pool
+from app.core.hyper_pool import (
+    HyperProcessPool,
+    get_hyper_process_parameters,
+    get_hyper_process_pool,
+)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    # Hyper writes its logs to the working directory otherwise
+    with patch("app.core.hyper_pool.settings.HYPER_LOG_DIR", str(tmp_path)):
+        pool = HyperProcessPool(size=1, max_jobs=2)
+        yield pool
+        pool.close()
+
+
+class TestHyperProcessPool:
+    def test_processes_are_reused(self, pool):
+        with pool.lease() as process:
+            assert pool.is_healthy(process)
+        with pool.lease() as reused:
+            assert reused is process
+
+    def test_processes_are_restarted_after_max_jobs(self, pool):
+        with pool.lease() as process:
+            pass
+        with pool.lease():
+            pass
+        assert not process.is_open
+        with pool.lease() as restarted:
+            assert restarted is not process
+            assert pool.is_healthy(restarted)
+
+    def test_crashed_processes_are_restarted(self, pool):
+        with pool.lease() as process:
+            pass
+        # Simulate a crash of the idle process
+        process.close()
+        with pool.lease() as restarted:
+            assert restarted is not process
+            assert pool.is_healthy(restarted)
+
+    def test_pool_per_os_process(self):
+        with patch.object(hyper_pool, "_pool", None):
+            pool = get_hyper_process_pool()
+            assert get_hyper_process_pool() is pool
+            with patch("app.core.hyper_pool.os.getpid", return_value=pool.pid + 1):
+                assert get_hyper_process_pool() is not pool
+
+    def test_process_parameters(self, tmp_path):
+        log_dir = tmp_path / "logs"
+        with patch.multiple(
+            "app.core.hyper_pool.settings",
+            HYPER_DATABASE_VERSION=2,
+            HYPER_MEMORY_LIMIT="1g",
+            HYPER_LOG_DIR=str(log_dir),
+            HYPER_PROCESS_PARAMETERS={"log_file_max_count": "2"},
+        ):
+            assert get_hyper_process_parameters() == {
+                "default_database_version": "2",
+                "memory_limit": "1g",
+                "log_dir": str(log_dir),
+                "log_file_max_count": "2",
+            }
+            pool = HyperProcessPool(size=1, max_jobs=1)
+            with pool.lease() as process:
+                assert pool.is_healthy(process)
+            assert (log_dir / "hyperd.log").exists()
@@ -0,0 +1,987 @@
+import csv
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import httpx
+import pandas as pd
+import pytest
+import requests
+from tableauhyperapi import Connection, HyperProcess, Name, SqlType, Telemetry
+
+from app.common_tags import (
+    EXPORT_DIGEST_METADATA,
+    EXPORT_JOB_METADATA,
+    FORM_STATE_METADATA,
+    LAST_DATE_MODIFIED_METADATA,
+    LAST_SUBMISSION_ID_METADATA,
+    SYNC_FAILURES_METADATA,
+    SYNC_RESULT_METADATA,
+)
+from app.core.exceptions import (
+    ExportConversionError,
+    ExportInProgress,
+    FailedExternalRequest,
+    IncompatibleSchema,
+)
+from app.core.importer import (
+    CSV_NA_VALUES,
+    Importer,
+    _csv_columns,
+    _hash_file,
+    _prep_csv_for_import,
+    import_to_hyper,
+    prewarm_export,
+    schedule_export_prewarm,
+)
+from app.core.schema import get_form_field_types, pandas_type_to_hyper_sql_type
+from app.core.scratch import ScratchJob, ScratchSpace
+from app.schemas import FileStatusEnum, SyncModeEnum
+
+CSV_EXPORT = """_id,age,height,name,consent,empty
+1,21,1.5,Alice,True,
+2,n/a,1.0,Bob,False,n/a
+3,35,1.75,42,True,
+4,40,2,Eve,n/a,
+"""
+
+
+@pytest.fixture(scope="module")
+def hyper_process(tmp_path_factory):
+    with HyperProcess(
+        telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU,
+        parameters={"log_dir": str(tmp_path_factory.mktemp("hyper-logs"))},
+    ) as process:
+        yield process
+
+
+@pytest.fixture
+def importer(hyper_process):
+    importer = Importer(
+        hyperfile=MagicMock(id=1, filename="export.hyper", configuration=None),
+        db=MagicMock(),
+        redis_client=fakeredis.FakeRedis(),
+    )
+    importer.process = hyper_process
+    # Exports are shared across tests otherwise
+    with patch("app.core.importer.settings.IMPORT_SHARE_EXPORTS", False):
+        yield importer
+
+
+def _apply_update(db, db_obj, obj_in):
+    for field, value in obj_in.items():
+        setattr(db_obj, field, value)
+    return db_obj
+
+
+@pytest.fixture
+def mock_crud(tmp_path):
+    with patch("app.core.importer.crud") as mock_crud:
+        mock_crud.hyperfile.get_local_path.return_value = str(tmp_path / "export.hyper")
+        mock_crud.hyperfile.update.side_effect = _apply_update
+        mock_crud.hyperfile.update_status.side_effect = (
+            lambda db, obj, status: _apply_update(db, obj, {"file_status": status})
+        )
+        mock_crud.hyperfile.sync_upstreams.side_effect = lambda db, obj: obj
+        yield mock_crud
+
+
+def _export(csv_path: Path, export: str = CSV_EXPORT) -> Callable:
+    """
+    Returns a stub of `OnaDataAPIClient.download_export` exporting `export`
+    to `csv_path`
+    """
+
+    def download_export(*args, **kwargs) -> Path:
+        csv_path.write_text(export)
+        return csv_path
+
+    return download_export
+
+
+@pytest.fixture
+def mock_client(tmp_path):
+    """
+    Onadata client whose exports hold CSV_EXPORT. Form definitions are
+    unavailable so that schemas are derived from the exports
+    """
+    with patch("app.core.importer.fernet_decrypt"), patch(
+        "app.core.importer.OnaDataAPIClient"
+    ) as mock_client_class:
+        client = mock_client_class.return_value
+        client.download_export.side_effect = _export(tmp_path / "export.csv")
+        client.get_form_definition.side_effect = FailedExternalRequest()
+        client.find_export.return_value = None
+        yield client
+
+
+def _read_extract(process, hyper_path) -> list:
+    with Connection(endpoint=process.endpoint, database=hyper_path) as connection:
+        return connection.execute_list_query(
+            'SELECT * FROM "Extract"."Extract" ORDER BY "_id"'
+        )
+
+
+class TestImporter:
+    def test_prep_csv_for_import(self, tmp_path):
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+
+        columns = _prep_csv_for_import(csv_path, chunksize=2)
+
+        assert [(column.name, column.type) for column in columns] == [
+            (Name("_id"), SqlType.big_int()),
+            (Name("age"), SqlType.big_int()),
+            (Name("height"), SqlType.double()),
+            (Name("name"), SqlType.text()),
+            (Name("consent"), SqlType.bool()),
+            (Name("empty"), SqlType.big_int()),
+        ]
+        prepped = pd.read_csv(csv_path, keep_default_na=False)
+        assert prepped["age"].tolist() == ["21", "NULL", "35", "40"]
+        assert prepped["name"].tolist() == ["Alice", "Bob", "42", "Eve"]
+
+    def test_prep_csv_for_import_matches_full_load(self, tmp_path):
+        """
+        Chunked schema inference derives the same columns as loading
+        the whole export at once
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        df = pd.read_csv(csv_path, na_values=CSV_NA_VALUES).convert_dtypes()
+        expected = [
+            (Name(name), pandas_type_to_hyper_sql_type(dtype.kind)())
+            for name, dtype in df.dtypes.items()
+        ]
+
+        for chunksize in [1, 3, 100]:
+            csv_path.write_text(CSV_EXPORT)
+            columns = _prep_csv_for_import(csv_path, chunksize=chunksize)
+            assert [(column.name, column.type) for column in columns] == expected
+
+    @pytest.mark.parametrize("rewrite_csv", [True, False])
+    def test_import_csv_to_hyper(self, importer, tmp_path, rewrite_csv):
+        """
+        Exports copied into Hyper as is hold the same data as re-written
+        exports
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        hyper_path = str(tmp_path / "export.hyper")
+
+        with patch("app.core.importer.settings.IMPORT_REWRITE_CSV", rewrite_csv):
+            count = importer._import_csv_to_hyper(hyper_path, csv_path)
+
+        assert count == 4
+        assert (csv_path.read_text() == CSV_EXPORT) is not rewrite_csv
+        assert _read_extract(importer.process, hyper_path) == [
+            [1, 21, 1.5, "Alice", True, None],
+            [2, None, 1.0, "Bob", False, None],
+            [3, 35, 1.75, "42", True, None],
+            [4, 40, 2.0, "Eve", None, None],
+        ]
+
+    def test_import_csv_to_hyper_with_form_definition(
+        self, importer, tmp_path, form_definition
+    ):
+        """
+        Column types are derived from the form definition when available
+        instead of the exported values
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text("_id,name,Age,height\n1,42,n/a,1.5\n")
+        hyper_path = str(tmp_path / "export.hyper")
+        importer.field_types = get_form_field_types(form_definition)
+
+        assert importer._import_csv_to_hyper(hyper_path, csv_path) == 1
+        with Connection(
+            endpoint=importer.process.endpoint, database=hyper_path
+        ) as connection:
+            table = connection.catalog.get_table_definition(importer.table_name)
+        assert [column.type for column in table.columns] == [
+            SqlType.big_int(),
+            SqlType.text(),
+            SqlType.big_int(),
+            SqlType.double(),
+        ]
+        assert _read_extract(importer.process, hyper_path) == [[1, "42", None, 1.5]]
+
+    def test_import_csv_to_hyper_native_types(
+        self, importer, tmp_path, form_definition
+    ):
+        """
+        Dates, timestamps, booleans & geopoint components are stored using
+        native Hyper types
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(
+            "_id,start,visit_date,fruits/apple,location,_location_latitude,"
+            "_submission_time\n"
+            "1,2024-01-01T10:00:00.000+03:00,2024-01-01,True,"
+            "-1.2 36.8 0 0,-1.2,2024-01-01T07:05:00\n"
+            "2,n/a,n/a,False,n/a,n/a,2024-01-02T07:05:00\n"
+        )
+        hyper_path = str(tmp_path / "export.hyper")
+        importer.field_types = get_form_field_types(form_definition)
+
+        assert importer._import_csv_to_hyper(hyper_path, csv_path) == 2
+        with Connection(
+            endpoint=importer.process.endpoint, database=hyper_path
+        ) as connection:
+            table = connection.catalog.get_table_definition(importer.table_name)
+        assert [column.type for column in table.columns] == [
+            SqlType.big_int(),
+            SqlType.timestamp_tz(),
+            SqlType.date(),
+            SqlType.bool(),
+            SqlType.text(),
+            SqlType.double(),
+            SqlType.timestamp(),
+        ]
+        rows = _read_extract(importer.process, hyper_path)
+        assert [row[3] for row in rows] == [True, False]
+        assert [row[5] for row in rows] == [-1.2, None]
+        assert str(rows[0][2]) == "2024-01-01"
+        assert rows[1][1] is None
+
+    @pytest.mark.parametrize("from_form", [True, False])
+    @pytest.mark.parametrize("use_arrow", [True, False])
+    def test_import_csv_to_hyper_duplicate_columns(
+        self, importer, tmp_path, from_form, use_arrow, form_definition
+    ):
+        """
+        Duplicate columns within exports are renamed the same way pandas
+        renames them
+        """
+        if use_arrow:
+            pytest.importorskip("pyarrow")
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text("_id,Name,age,Name\n1,Alice,21,Bob\n2,Eve,n/a,n/a\n")
+        hyper_path = str(tmp_path / "export.hyper")
+        if from_form:
+            importer.field_types = get_form_field_types(form_definition)
+
+        with patch("app.core.importer.settings.IMPORT_ARROW", use_arrow):
+            assert importer._import_csv_to_hyper(hyper_path, csv_path) == 2
+
+        with Connection(
+            endpoint=importer.process.endpoint, database=hyper_path
+        ) as connection:
+            table = connection.catalog.get_table_definition(importer.table_name)
+        assert [column.name for column in table.columns] == [
+            Name(name) for name in pd.read_csv(csv_path).columns
+        ]
+        assert _read_extract(importer.process, hyper_path) == [
+            [1, "Alice", 21, "Bob"],
+            [2, "Eve", None, None],
+        ]
+
+    @pytest.mark.parametrize("from_form", [True, False])
+    def test_import_csv_to_hyper_with_arrow(
+        self, importer, tmp_path, from_form, form_definition
+    ):
+        """
+        Exports converted to Parquet with Arrow hold the same data as
+        exports read by Hyper as is
+        """
+        pytest.importorskip("pyarrow")
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        if from_form:
+            csv_path.write_text(
+                "_id,start,visit_date,fruits/apple,location,_submission_time\n"
+                "1,2024-01-01T10:00:00.000+03:00,2024-01-01,True,"
+                "-1.2 36.8 0 0,2024-01-01T07:05:00\n"
+                "2,n/a,n/a,False,n/a,2024-01-02T07:05:00\n"
+            )
+            importer.field_types = get_form_field_types(form_definition)
+        direct_path = str(tmp_path / "csv.hyper")
+        arrow_path = str(tmp_path / "arrow.hyper")
+
+        count = importer._import_csv_to_hyper(direct_path, csv_path)
+        with patch("app.core.importer.settings.IMPORT_ARROW", True):
+            assert importer._import_csv_to_hyper(arrow_path, csv_path) == count
+
+        assert not csv_path.with_suffix(".parquet").exists()
+        column_types = []
+        for hyper_path in [direct_path, arrow_path]:
+            with Connection(
+                endpoint=importer.process.endpoint, database=hyper_path
+            ) as connection:
+                table = connection.catalog.get_table_definition(importer.table_name)
+            column_types.append([column.type for column in table.columns])
+        assert column_types[0] == column_types[1]
+        assert _read_extract(importer.process, arrow_path) == _read_extract(
+            importer.process, direct_path
+        )
+
+    def test_import_csv_to_hyper_with_arrow_timestamp_offsets(
+        self, importer, tmp_path, form_definition
+    ):
+        """
+        Zone offsets of naive timestamps are dropped the same way Hyper
+        drops them
+        """
+        pytest.importorskip("pyarrow")
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(
+            "_id,_date_modified\n"
+            "1,2021-05-04T09:38:27.585789+00:00\n"
+            "2,2021-05-04T10:38:27+03:00\n"
+            "3,2021-05-04T11:38:27Z\n"
+            "4,2021-05-04T12:38:27\n"
+        )
+        importer.field_types = get_form_field_types(form_definition)
+        direct_path = str(tmp_path / "csv.hyper")
+        arrow_path = str(tmp_path / "arrow.hyper")
+
+        assert importer._import_csv_to_hyper(direct_path, csv_path) == 4
+        with patch("app.core.importer.settings.IMPORT_ARROW", True), patch(
+            "app.core.importer._csv_insert_command"
+        ) as mock_insert_command:
+            assert importer._import_csv_to_hyper(arrow_path, csv_path) == 4
+        mock_insert_command.assert_not_called()
+        assert _read_extract(importer.process, arrow_path) == _read_extract(
+            importer.process, direct_path
+        )
+
+    def test_import_csv_to_hyper_with_arrow_conversion_errors(self, importer, tmp_path):
+        """
+        Exports Arrow fails to convert are read by Hyper
+        """
+        pytest.importorskip("pyarrow")
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        hyper_path = str(tmp_path / "export.hyper")
+
+        with patch("app.core.importer.settings.IMPORT_ARROW", True), patch(
+            "app.core.importer.csv_to_parquet",
+            side_effect=ExportConversionError("Invalid value"),
+        ):
+            assert importer._import_csv_to_hyper(hyper_path, csv_path) == 4
+        assert len(_read_extract(importer.process, hyper_path)) == 4
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+    def test_stream_csv_to_hyper(self, importer, tmp_path, chunk_size, form_definition):
+        """
+        Streamed exports hold the same data as downloaded exports
+        """
+        export = CSV_EXPORT.replace("Alice", "Zoë").encode()
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_bytes(export)
+        importer.field_types = get_form_field_types(form_definition)
+        downloaded_path = str(tmp_path / "downloaded.hyper")
+        streamed_path = str(tmp_path / "streamed.hyper")
+        chunks = (export[i : i + chunk_size] for i in range(0, len(export), chunk_size))
+
+        count, digest = importer._stream_csv_to_hyper(streamed_path, chunks)
+
+        assert count == importer._import_csv_to_hyper(downloaded_path, csv_path)
+        assert digest == _hash_file(csv_path)
+        assert _read_extract(importer.process, streamed_path) == _read_extract(
+            importer.process, downloaded_path
+        )
+
+    def test_stream_csv_to_hyper_failures(self, importer, tmp_path, form_definition):
+        """
+        Failed downloads & inserts stop the whole stream
+        """
+        importer.field_types = get_form_field_types(form_definition)
+        hyper_path = str(tmp_path / "export.hyper")
+
+        def interrupted_download():
+            yield b"_id,name\n1,Alice\n"
+            raise FailedExternalRequest("Connection reset")
+
+        with pytest.raises(FailedExternalRequest):
+            importer._stream_csv_to_hyper(hyper_path, interrupted_download())
+
+        def endless_download():
+            yield b"_id,name\n1,Alice,unexpected\n"
+            while True:
+                yield b"1,Alice\n"
+
+        with pytest.raises(csv.Error):
+            importer._stream_csv_to_hyper(hyper_path, endless_download())
+
+    def test_get_form_field_types(self, importer, form_definition):
+        """
+        The form definition is only retrieved when the form has changed
+        since its field types were last derived
+        """
+        client = MagicMock()
+        client.get_form_definition.return_value = form_definition
+        form = {"formid": 1, "version": "1", "hash": "a"}
+
+        field_types = importer._get_form_field_types(client, form)
+        assert field_types == get_form_field_types(form_definition)
+        assert importer._get_form_field_types(client, form) == field_types
+        assert client.get_form_definition.call_count == 1
+
+        form = {"formid": 1, "version": "2", "hash": "b"}
+        assert importer._get_form_field_types(client, form) == field_types
+        assert client.get_form_definition.call_count == 2
+
+        client.get_form_definition.side_effect = FailedExternalRequest()
+        form = {"formid": 1, "version": "3", "hash": "c"}
+        assert importer._get_form_field_types(client, form) is None
+
+    def test_append_csv_to_hyper(self, importer, tmp_path):
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        hyper_path = str(tmp_path / "export.hyper")
+        importer._import_csv_to_hyper(hyper_path, csv_path)
+        assert importer._get_sync_marks(hyper_path) == {LAST_SUBMISSION_ID_METADATA: 4}
+
+        # Columns missing from the new submissions are left empty
+        csv_path.write_text("_id,name,age\n5,Mallory,n/a\n")
+        count = importer._append_csv_to_hyper(hyper_path, csv_path)
+
+        assert count == 1
+        assert importer._get_sync_marks(hyper_path) == {LAST_SUBMISSION_ID_METADATA: 5}
+        assert _read_extract(importer.process, hyper_path)[-1] == [
+            5,
+            None,
+            None,
+            "Mallory",
+            None,
+            None,
+        ]
+
+        # New columns are added to the existing table
+        csv_path.write_text("_id,nickname\n6,Mal\n")
+        assert importer._append_csv_to_hyper(hyper_path, csv_path) == 1
+        assert _read_extract(importer.process, hyper_path)[-1][-1] == "Mal"
+
+    def test_append_csv_to_hyper_evolves_schema(self, importer, tmp_path):
+        """
+        Columns are added & widened in place when the incoming columns
+        don't match the existing table
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        hyper_path = str(tmp_path / "export.hyper")
+        importer._import_csv_to_hyper(hyper_path, csv_path)
+
+        csv_path.write_text("_id,age,consent,nickname\n5,30.5,maybe,Mal\n")
+        assert importer._append_csv_to_hyper(hyper_path, csv_path) == 1
+
+        with Connection(
+            endpoint=importer.process.endpoint, database=hyper_path
+        ) as connection:
+            table = connection.catalog.get_table_definition(importer.table_name)
+            columns = {column.name.unescaped: column.type for column in table.columns}
+            rows = connection.execute_list_query(
+                f"SELECT {Name('age')}, {Name('consent')}, {Name('nickname')} "
+                f"FROM {importer.table_name} ORDER BY {Name('_id')}"
+            )
+        assert columns["age"] == SqlType.double()
+        assert columns["consent"] == SqlType.text()
+        assert columns["nickname"] == SqlType.text()
+        assert rows == [
+            [21.0, "True", None],
+            [None, "False", None],
+            [35.0, "True", None],
+            [40.0, None, None],
+            [30.5, "maybe", "Mal"],
+        ]
+
+        # Tables that no longer exist are re-created by a full sync
+        with Connection(
+            endpoint=importer.process.endpoint, database=hyper_path
+        ) as connection:
+            connection.execute_command(f"DROP TABLE {importer.table_name}")
+        with pytest.raises(IncompatibleSchema):
+            importer._append_csv_to_hyper(hyper_path, csv_path)
+
+    @patch("app.core.importer.settings.IMPORT_SYNC_MODE", "incremental")
+    def test_import_csv_incrementally(self, importer, tmp_path, mock_crud, mock_client):
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(CSV_EXPORT)
+        hyper_path = str(tmp_path / "export.hyper")
+        importer._import_csv_to_hyper(hyper_path, csv_path)
+        importer.hyperfile.meta_data = {LAST_SUBMISSION_ID_METADATA: 4}
+        mock_crud.hyperfile.get_latest_file.return_value = hyper_path
+        csv_path.write_text("_id,name\n5,Mallory\n6,Trent\n")
+        mock_client.download_export.side_effect = None
+        mock_client.download_export.return_value = csv_path
+        mock_client.get_form.return_value = {"formid": 1, "num_of_submissions": 6}
+
+        assert importer.import_csv()
+
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile,
+            query={"_id": {"$gt": 4}},
+            job_uuid=None,
+            export_url=None,
+        )
+        assert len(_read_extract(importer.process, hyper_path)) == 6
+        assert importer.hyperfile.meta_data[LAST_SUBMISSION_ID_METADATA] == 6
+        mock_crud.hyperfile.sync_upstreams.assert_called_once()
+
+        # Upstreams aren't synced when there are no new submissions
+        csv_path.write_text("_id,name\n")
+        mock_client.get_form.return_value = {"formid": 1, "num_of_submissions": 5}
+        assert importer.import_csv()
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile,
+            query={"_id": {"$gt": 6}},
+            job_uuid=None,
+            export_url=None,
+        )
+        mock_crud.hyperfile.sync_upstreams.assert_called_once()
+
+    def test_import_csv_skips_unchanged_forms(
+        self, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Forms whose submissions, definition & export settings haven't changed
+        since the last successful sync aren't exported again
+        """
+        hyper_path = str(tmp_path / "export.hyper")
+        importer.hyperfile.meta_data = {}
+        mock_crud.hyperfile.get_latest_file.return_value = hyper_path
+        form = {
+            "formid": 1,
+            "num_of_submissions": 4,
+            "last_submission_time": "2024-01-04T10:00:00",
+            "date_modified": "2024-01-01T10:00:00",
+        }
+        mock_client.get_form.return_value = form
+
+        assert importer.import_csv()
+        assert importer.import_csv()
+        assert mock_client.download_export.call_count == 1
+        assert mock_crud.hyperfile.sync_upstreams.call_count == 1
+
+        mock_client.get_form.return_value = {
+            **form,
+            "date_modified": "2024-01-05T10:00:00",
+        }
+        assert importer.import_csv()
+        assert mock_client.download_export.call_count == 2
+
+        with patch("app.core.importer.settings.IMPORT_SKIP_UNCHANGED_FORMS", False):
+            assert importer.import_csv()
+        assert mock_client.download_export.call_count == 3
+
+    def test_import_csv_falls_back_to_inferred_schema(
+        self, importer, tmp_path, mock_crud, mock_client, form_definition
+    ):
+        """
+        Exports holding values that don't fit the type of their question,
+        i.e answers given before the question's type changed, are imported
+        with the schema derived from the export
+        """
+        importer.hyperfile.meta_data = {}
+        mock_client.get_form.return_value = {"formid": 1, "num_of_submissions": 2}
+        mock_client.get_form_definition.side_effect = None
+        mock_client.get_form_definition.return_value = form_definition
+        mock_client.download_export.side_effect = _export(
+            tmp_path / "export.csv", "_id,age\n1,21\n2,twenty\n"
+        )
+
+        assert importer.import_csv()
+        assert importer.field_types is None
+        assert mock_client.download_export.call_count == 2
+        assert _read_extract(importer.process, str(tmp_path / "export.hyper")) == [
+            [1, "21"],
+            [2, "twenty"],
+        ]
+
+    def test_import_csv_records_request_timeouts(
+        self, importer, mock_crud, mock_client
+    ):
+        """
+        Requests to Onadata timing out fail the sync instead of the job
+        """
+        importer.hyperfile.meta_data = {}
+        mock_client.get_form.side_effect = requests.exceptions.ReadTimeout()
+        mock_client.download_export.side_effect = httpx.ReadTimeout("timed out")
+
+        assert importer.import_csv() is False
+        assert importer.hyperfile.file_status == FileStatusEnum.latest_sync_failed
+        assert importer.hyperfile.meta_data[SYNC_FAILURES_METADATA] == 1
+
+        mock_client.download_export.side_effect = requests.exceptions.ConnectTimeout()
+        assert importer.import_csv() is False
+        assert importer.hyperfile.meta_data[SYNC_FAILURES_METADATA] == 2
+        mock_crud.hyperfile.sync_upstreams.assert_not_called()
+
+    def test_import_csv_skips_unchanged_exports(
+        self, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Exports identical to the last synced export aren't imported, uploaded
+        or published again
+        """
+        hyper_path = str(tmp_path / "export.hyper")
+        importer.hyperfile.meta_data = {}
+        mock_crud.hyperfile.get_latest_file.return_value = hyper_path
+        mock_client.get_form.side_effect = FailedExternalRequest()
+
+        assert importer.import_csv()
+        assert importer.hyperfile.meta_data[SYNC_RESULT_METADATA] == "updated"
+        assert importer.hyperfile.meta_data[EXPORT_DIGEST_METADATA]
+
+        with patch.object(importer, "_import_csv_to_hyper") as mock_import:
+            assert importer.import_csv()
+        mock_import.assert_not_called()
+        assert mock_client.download_export.call_count == 2
+        assert mock_crud.hyperfile.sync_upstreams.call_count == 1
+        assert importer.hyperfile.meta_data[SYNC_RESULT_METADATA] == "unchanged"
+        assert importer.hyperfile.file_status == FileStatusEnum.file_available
+        # Full syncs don't download the previous Hyper database
+        mock_crud.hyperfile.get_latest_file.assert_not_called()
+
+    @patch("app.core.importer.schedule_delayed_job")
+    def test_import_csv_defers_exports_in_progress(
+        self, mock_schedule, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Syncs waiting on Onadata to build an export are re-scheduled to check
+        on the export later with an increasing delay
+        """
+        csv_path = tmp_path / "export.csv"
+        importer.hyperfile.meta_data = {}
+        mock_client.get_form.side_effect = FailedExternalRequest()
+        mock_client.download_export.side_effect = ExportInProgress("abc")
+
+        assert importer.import_csv() is None
+        assert importer.import_csv() is None
+        assert importer.hyperfile.meta_data[EXPORT_JOB_METADATA]["attempts"] == 2
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile, query=None, job_uuid="abc", export_url=None
+        )
+        assert [call.args[2] for call in mock_schedule.call_args_list] == [
+            timedelta(seconds=30),
+            timedelta(seconds=60),
+        ]
+        mock_crud.hyperfile.sync_upstreams.assert_not_called()
+
+        # The export is imported once it's ready
+        mock_client.download_export.side_effect = _export(csv_path)
+        assert importer.import_csv()
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile, query=None, job_uuid="abc", export_url=None
+        )
+        assert EXPORT_JOB_METADATA not in importer.hyperfile.meta_data
+        mock_crud.hyperfile.sync_upstreams.assert_called_once()
+
+        # Syncs fail once the export has been checked on too many times
+        mock_client.download_export.side_effect = ExportInProgress("def")
+        with patch("app.core.importer.settings.EXPORT_POLL_MAX_ATTEMPTS", 1):
+            assert importer.import_csv() is None
+            assert importer.import_csv() is False
+        assert importer.hyperfile.file_status == FileStatusEnum.latest_sync_failed
+        assert mock_schedule.call_count == 3
+
+    @patch("app.core.importer.schedule_delayed_job")
+    def test_deferred_syncs_record_the_exported_form_state(
+        self, mock_schedule, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Deferred syncs record the state of the form when the export was
+        requested; changes made while Onadata built the export are synced
+        by the next sync
+        """
+        csv_path = tmp_path / "export.csv"
+        importer.hyperfile.meta_data = {}
+        mock_schedule.return_value = MagicMock(id="follow-up")
+        form = {"formid": 1, "num_of_submissions": 4}
+        mock_client.get_form.return_value = form
+        mock_client.download_export.side_effect = ExportInProgress("abc")
+
+        assert importer.import_csv() is None
+        export_job = importer.hyperfile.meta_data[EXPORT_JOB_METADATA]
+        assert export_job["follow_up_job_id"] == "follow-up"
+        exported_state = export_job["form_state"]
+        assert exported_state["num_of_submissions"] == 4
+
+        # Submissions made while the export is built
+        mock_client.get_form.return_value = {**form, "num_of_submissions": 5}
+        assert importer.import_csv() is None
+        export_job = importer.hyperfile.meta_data[EXPORT_JOB_METADATA]
+        assert export_job["form_state"] == exported_state
+
+        mock_client.download_export.side_effect = _export(csv_path)
+        assert importer.import_csv()
+        assert importer.hyperfile.meta_data[FORM_STATE_METADATA] == exported_state
+
+        # The submissions missing from the export are synced
+        assert importer.import_csv()
+        assert mock_client.download_export.call_count == 4
+        assert (
+            importer.hyperfile.meta_data[FORM_STATE_METADATA]["num_of_submissions"] == 5
+        )
+
+    @patch("app.core.importer.schedule_export_prewarm")
+    @patch("app.core.importer.Importer")
+    @patch("app.core.importer.get_current_job")
+    @patch("app.core.importer.is_job_pending")
+    @patch("app.core.importer.crud")
+    @patch("app.core.importer.SessionLocal")
+    def test_import_to_hyper_waits_on_follow_up_jobs(
+        self,
+        mock_session,
+        mock_crud,
+        mock_pending,
+        mock_current_job,
+        mock_importer,
+        mock_prewarm,
+    ):
+        """
+        Syncs waiting on an export are only resumed by their follow-up job
+        """
+        hyperfile = MagicMock(
+            id=1,
+            meta_data={EXPORT_JOB_METADATA: {"follow_up_job_id": "follow-up"}},
+        )
+        mock_crud.hyperfile.get.return_value = hyperfile
+        mock_current_job.return_value = MagicMock(id="cron")
+        mock_pending.return_value = True
+
+        import_to_hyper(1, False)
+        mock_pending.assert_called_once_with("follow-up")
+        mock_importer.assert_not_called()
+
+        mock_current_job.return_value = MagicMock(id="follow-up")
+        import_to_hyper(1, False)
+        mock_importer.assert_called_once()
+
+        # Follow-up jobs that are lost don't hold up the sync
+        mock_current_job.return_value = None
+        mock_pending.return_value = False
+        import_to_hyper(1, False)
+        assert mock_importer.call_count == 2
+
+    def test_prewarm_export(self, importer, tmp_path, mock_crud, mock_client):
+        """
+        Exports requested ahead of a sync are imported by the sync
+        """
+        importer.hyperfile.meta_data = {}
+        mock_client.get_form.side_effect = FailedExternalRequest()
+        mock_client.request_export.return_value = "abc"
+
+        importer.prewarm_export()
+        importer.prewarm_export()
+        mock_client.request_export.assert_called_once_with(
+            importer.hyperfile, query=None
+        )
+        importer.db.refresh.assert_called_once_with(importer.hyperfile)
+
+        assert importer.import_csv()
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile, query=None, job_uuid="abc", export_url=None
+        )
+        assert EXPORT_JOB_METADATA not in importer.hyperfile.meta_data
+
+    def test_prewarm_export_skips_syncing_files(self, importer, mock_crud, mock_client):
+        """
+        Exports aren't requested for, or recorded on, HyperFiles being synced
+        """
+        importer.hyperfile.meta_data = {}
+        importer.hyperfile.file_status = FileStatusEnum.syncing
+        mock_client.get_form.side_effect = FailedExternalRequest()
+        mock_client.request_export.return_value = "abc"
+
+        importer.prewarm_export()
+        mock_client.request_export.assert_not_called()
+
+        # Syncs that start while the export is requested
+        importer.hyperfile.file_status = FileStatusEnum.file_available
+        importer.db.refresh.side_effect = lambda hyperfile: setattr(
+            hyperfile, "file_status", FileStatusEnum.syncing
+        )
+        importer.prewarm_export()
+        mock_client.request_export.assert_called_once()
+        assert EXPORT_JOB_METADATA not in importer.hyperfile.meta_data
+        mock_crud.hyperfile.update.assert_not_called()
+
+    def test_prewarmed_syncs_record_the_exported_form_state(
+        self, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Syncs of exports requested ahead of time record the state of the form
+        when the export was requested & don't share the export
+        """
+        importer.hyperfile.meta_data = {}
+        importer.hyperfile.user.server_id = 1
+        importer.hyperfile.form_id = 1
+        form = {"formid": 1, "num_of_submissions": 4}
+        mock_client.get_form.return_value = form
+        mock_client.request_export.return_value = "abc"
+        mock_client.scratch = ScratchJob(
+            ScratchSpace(root=str(tmp_path / "scratch")), "test"
+        )
+
+        importer.prewarm_export()
+        prewarmed_state = importer.hyperfile.meta_data[EXPORT_JOB_METADATA][
+            "form_state"
+        ]
+        # Submissions made after the export was requested
+        mock_client.get_form.return_value = {**form, "num_of_submissions": 5}
+        with patch.multiple(
+            "app.core.importer.settings",
+            IMPORT_SHARE_EXPORTS=True,
+            EXPORT_CACHE_ROOT=str(tmp_path / "exports"),
+        ):
+            assert importer.import_csv()
+            mock_client.download_export.assert_called_with(
+                importer.hyperfile, query=None, job_uuid="abc", export_url=None
+            )
+            assert importer.hyperfile.meta_data[FORM_STATE_METADATA] == prewarmed_state
+            assert not list((tmp_path / "exports").glob("*.csv"))
+
+            # The submissions missing from the export are synced
+            assert importer.import_csv()
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile, query=None, job_uuid=None, export_url=None
+        )
+        assert (
+            importer.hyperfile.meta_data[FORM_STATE_METADATA]["num_of_submissions"] == 5
+        )
+
+    @patch("app.core.importer.schedule_delayed_job")
+    @patch("app.core.importer.get_next_cron_time")
+    def test_schedule_export_prewarm(self, mock_next_cron_time, mock_schedule):
+        mock_next_cron_time.return_value = datetime.now(timezone.utc) + timedelta(
+            minutes=15
+        )
+
+        schedule_export_prewarm(1)
+        func, args, delay = mock_schedule.call_args.args
+        assert (func, args) == (prewarm_export, [1])
+        assert timedelta(minutes=9) < delay <= timedelta(minutes=10)
+
+        # Exports aren't requested when the sync is due within the lead time
+        with patch("app.core.importer.settings.EXPORT_PREWARM_LEAD_TIME", 60 * 20):
+            schedule_export_prewarm(1)
+        assert mock_schedule.call_count == 1
+
+    def test_import_csv_reuses_fresh_exports(
+        self, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Existing exports built after the form's data last changed are
+        downloaded instead of requesting a new export
+        """
+        importer.hyperfile.meta_data = {}
+        mock_client.get_form.return_value = {
+            "formid": 1,
+            "last_submission_time": "2024-01-04T10:00:00",
+            "date_modified": "2024-01-01T10:00:00",
+        }
+        mock_client.find_export.return_value = "https://example.com/1.csv"
+
+        assert importer.import_csv()
+        mock_client.find_export.assert_called_once_with(
+            importer.hyperfile,
+            created_after=datetime(2024, 1, 4, 10, tzinfo=timezone.utc),
+        )
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile,
+            query=None,
+            job_uuid=None,
+            export_url="https://example.com/1.csv",
+        )
+
+        with patch("app.core.importer.settings.IMPORT_REUSE_EXPORTS", False):
+            assert importer.import_csv(sync_mode=SyncModeEnum.full)
+        mock_client.find_export.assert_called_once()
+        mock_client.download_export.assert_called_with(
+            importer.hyperfile, query=None, job_uuid=None, export_url=None
+        )
+
+    def test_import_csv_shares_exports(
+        self, importer, tmp_path, mock_crud, mock_client
+    ):
+        """
+        Syncs of the same form data & export settings share the export and
+        the columns derived from it
+        """
+        importer.hyperfile.meta_data = {}
+        importer.hyperfile.user.server_id = 1
+        importer.hyperfile.form_id = 1
+        form = {"formid": 1, "num_of_submissions": 4}
+        mock_client.get_form.return_value = form
+        mock_client.scratch = ScratchJob(
+            ScratchSpace(root=str(tmp_path / "scratch")), "test"
+        )
+
+        with patch.multiple(
+            "app.core.importer.settings",
+            IMPORT_SHARE_EXPORTS=True,
+            IMPORT_SKIP_UNCHANGED_FORMS=False,
+        ), patch(
+            "app.core.export_cache.settings.EXPORT_CACHE_ROOT", str(tmp_path / "cache")
+        ), patch(
+            "app.core.importer._csv_columns", wraps=_csv_columns
+        ) as mock_columns:
+            assert importer.import_csv()
+            assert importer.import_csv()
+            assert mock_client.download_export.call_count == 1
+            assert mock_columns.call_count == 1
+            rows = _read_extract(importer.process, str(tmp_path / "export.hyper"))
+            assert len(rows) == 4
+
+            # Exports of newer form data aren't shared
+            mock_client.get_form.return_value = {**form, "num_of_submissions": 5}
+            assert importer.import_csv()
+            assert mock_client.download_export.call_count == 2
+
+    def test_merge_csv_into_hyper(self, importer, tmp_path):
+        """
+        Merging changed submissions results in the same data as re-creating
+        the Hyper database from a full export
+        """
+        csv_path = tmp_path / "export.csv"
+        csv_path.write_text(
+            "_id,name,age,_date_modified\n"
+            "1,Alice,21,2024-01-01T10:00:00\n"
+            "2,Bob,n/a,2024-01-02T10:00:00\n"
+            "3,Eve,35,2024-01-03T10:00:00\n"
+        )
+        hyper_path = str(tmp_path / "export.hyper")
+        importer._import_csv_to_hyper(hyper_path, csv_path)
+        assert importer._get_sync_marks(hyper_path) == {
+            LAST_SUBMISSION_ID_METADATA: 3,
+            LAST_DATE_MODIFIED_METADATA: "2024-01-03T10:00:00",
+        }
+
+        # Bob's submission is edited, Eve's deleted & Mallory's added
+        csv_path.write_text(
+            "_id,name,age,_date_modified\n"
+            "2,Bob,30,2024-01-04T10:00:00\n"
+            "4,Mallory,40,2024-01-04T11:00:00\n"
+        )
+        count = importer._merge_csv_into_hyper(
+            hyper_path, csv_path, submission_ids=iter([[1, 2], [4]])
+        )
+
+        assert count == 3
+        full_csv_path = tmp_path / "full_export.csv"
+        full_csv_path.write_text(
+            "_id,name,age,_date_modified\n"
+            "1,Alice,21,2024-01-01T10:00:00\n"
+            "2,Bob,30,2024-01-04T10:00:00\n"
+            "4,Mallory,40,2024-01-04T11:00:00\n"
+        )
+        full_hyper_path = str(tmp_path / "full_export.hyper")
+        importer._import_csv_to_hyper(full_hyper_path, full_csv_path)
+        assert _read_extract(importer.process, hyper_path) == _read_extract(
+            importer.process, full_hyper_path
+        )
+
+        # Deletions are applied even when no submission was added or edited
+        csv_path.write_text("")
+        count = importer._merge_csv_into_hyper(
+            hyper_path, csv_path, submission_ids=iter([[1, 4]])
+        )
+        assert count == 1
+        assert [row[0] for row in _read_extract(importer.process, hyper_path)] == [
+            1,
+            4,
+        ]
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.exceptions import ExportInProgress
+from app.core.onadata import OnaDataAPIClient
+
+EXPORT_URL = "https://example.com/api/v1/forms/1/export_async.json?format=csv"
+
+
+def _response(status_code: int, json: dict = None) -> MagicMock:
+    return MagicMock(status_code=status_code, json=MagicMock(return_value=json))
+
+
+class TestOnaDataAPIClient:
+    def test_exports_in_progress_can_be_deferred(self):
+        client = OnaDataAPIClient(
+            "https://example.com", "token", wait_for_exports=False
+        )
+        client.client = MagicMock()
+        client.client.get.return_value = _response(
+            202, {"job_status": "PENDING", "job_uuid": "abc"}
+        )
+
+        with pytest.raises(ExportInProgress) as e:
+            client._get_export_url(EXPORT_URL)
+        assert e.value.job_uuid == "abc"
+        assert client.client.get.call_count == 1
+
+    def test_previous_export_jobs_are_checked_on(self):
+        hyperfile = MagicMock(form_id=1, configuration=None)
+        client = OnaDataAPIClient("https://example.com", "token")
+
+        assert client._get_export_request_url(hyperfile, job_uuid="abc") == (
+            f"{EXPORT_URL}&job_uuid=abc"
+        )
+
+    def test_request_export(self):
+        hyperfile = MagicMock(form_id=1, configuration=None)
+        client = OnaDataAPIClient("https://example.com", "token")
+        client.client = MagicMock()
+        client.client.get.return_value = _response(
+            202, {"job_status": "PENDING", "job_uuid": "abc"}
+        )
+
+        assert client.request_export(hyperfile) == "abc"
+        assert client.wait_for_exports
+        assert client.client.get.call_count == 1
+
+    def test_find_export(self):
+        hyperfile = MagicMock(form_id=1, configuration=None)
+        client = OnaDataAPIClient("https://example.com", "token")
+        client.client = MagicMock()
+        export = {
+            "id": 1,
+            "type": "csv",
+            "job_status": "Successful",
+            "date_created": "2024-01-02T10:00:00",
+            "export_url": "https://example.com/1.csv",
+            "options": {},
+        }
+        client.client.get.return_value = _response(
+            200,
+            [
+                export,
+                {
+                    **export,
+                    "id": 2,
+                    "date_created": "2024-01-02T11:00:00+00:00",
+                    "export_url": "https://example.com/2.csv",
+                },
+                {**export, "id": 3, "type": "xls", "date_created": "2024-01-03"},
+                {
+                    **export,
+                    "id": 4,
+                    "job_status": "Pending",
+                    "date_created": "2024-01-03",
+                },
+                {
+                    **export,
+                    "id": 5,
+                    "options": {"query": "{}"},
+                    "date_created": "2024-01-03",
+                },
+            ],
+        )
+
+        created_after = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        assert client.find_export(hyperfile, created_after) == (
+            "https://example.com/2.csv"
+        )
+        # Exports older than the latest submission aren't reused
+        created_after = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+        assert client.find_export(hyperfile, created_after) is None
+
+        # Exports built with other export settings aren't reused
+        hyperfile.configuration = MagicMock(export_settings={"include_labels": False})
+        created_after = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        assert client.find_export(hyperfile, created_after) is None
+
+    def test_find_export_without_configuration(self):
+        hyperfile = MagicMock(form_id=1, configuration=None)
+        client = OnaDataAPIClient("https://example.com", "token")
+        client.client = MagicMock()
+        export = {
+            "id": 1,
+            "type": "csv",
+            "job_status": "Successful",
+            "date_created": "2024-01-02T10:00:00",
+            "export_url": "https://example.com/1.csv",
+            "options": {"remove_group_name": "true"},
+        }
+        client.client.get.return_value = _response(200, [export])
+        created_after = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+        # Exports built with options other than Onadata's defaults aren't reused
+        assert client.find_export(hyperfile, created_after) is None
+
+        export["options"] = {"remove_group_name": "false", "include_labels": False}
+        assert client.find_export(hyperfile, created_after) == (
+            "https://example.com/1.csv"
+        )
@@ -0,0 +1,136 @@
+import io
+
+import fakeredis
+import pandas as pd
+from tableauhyperapi import Name, SqlType
+
+from app.core.schema import (
+    FormSchemaCache,
+    dedupe_column_names,
+    get_form_columns,
+    get_form_field_types,
+    widen_sql_type,
+)
+
+
+class TestSchema:
+    def test_get_form_field_types(self, form_definition):
+        field_types = get_form_field_types(form_definition)
+
+        assert field_types["age"] is SqlType.big_int
+        assert field_types["Age"] is SqlType.big_int
+        assert field_types["measurements/height"] is SqlType.double
+        assert field_types["height"] is SqlType.double
+        assert field_types["Child Age"] is SqlType.big_int
+        assert field_types["fruits"] is SqlType.text
+        assert field_types["fruits/apple"] is SqlType.bool
+        assert field_types["Fruits/Pear"] is SqlType.bool
+        assert field_types["visit_date"] is SqlType.date
+        assert field_types["start"] is SqlType.timestamp_tz
+        assert field_types["location"] is SqlType.text
+        assert field_types["_location_latitude"] is SqlType.double
+        assert field_types["_location_precision"] is SqlType.double
+
+    def test_get_form_field_types_select_multiple_export_settings(
+        self, form_definition
+    ):
+        """
+        Split select multiple columns hold booleans unless the export
+        holds the selected choices' values
+        """
+        for export_settings, sql_type in [
+            (None, SqlType.bool),
+            ({"value_select_multiples": False}, SqlType.bool),
+            (
+                {"value_select_multiples": False, "binary_select_multiples": True},
+                SqlType.bool,
+            ),
+            ({"value_select_multiples": True}, SqlType.text),
+        ]:
+            field_types = get_form_field_types(form_definition, export_settings)
+            assert field_types["fruits/apple"] is sql_type
+
+    def test_widen_sql_type(self):
+        assert widen_sql_type(None, SqlType.bool) is SqlType.bool
+        assert widen_sql_type(SqlType.big_int, SqlType.double) is SqlType.double
+        assert widen_sql_type(SqlType.double, SqlType.big_int) is SqlType.double
+        assert widen_sql_type(SqlType.bool, SqlType.big_int) is SqlType.text
+        assert widen_sql_type(SqlType.date, SqlType.date) is SqlType.date
+
+    def test_get_form_columns(self, form_definition):
+        header = [
+            "name",
+            "Age",
+            "measurements/height",
+            "children[1]/child_age",
+            "children[2]/child_age",
+            "fruits/apple",
+            "unknown",
+            "_id",
+            "_submission_time",
+        ]
+
+        columns = get_form_columns(get_form_field_types(form_definition), header)
+
+        assert [(column.name, column.type) for column in columns] == [
+            (Name("name"), SqlType.text()),
+            (Name("Age"), SqlType.big_int()),
+            (Name("measurements/height"), SqlType.double()),
+            (Name("children[1]/child_age"), SqlType.big_int()),
+            (Name("children[2]/child_age"), SqlType.big_int()),
+            (Name("fruits/apple"), SqlType.bool()),
+            (Name("unknown"), SqlType.text()),
+            (Name("_id"), SqlType.big_int()),
+            (Name("_submission_time"), SqlType.timestamp()),
+        ]
+
+    def test_dedupe_column_names(self):
+        header = ["name", "age", "name", "name.1", "name"]
+        csv_header = ",".join(header)
+
+        assert dedupe_column_names(header) == [
+            "name",
+            "age",
+            "name.2",
+            "name.1",
+            "name.3",
+        ]
+        assert dedupe_column_names(header) == list(
+            pd.read_csv(io.StringIO(csv_header)).columns
+        )
+
+    def test_get_form_columns_duplicate_header(self, form_definition):
+        columns = get_form_columns(
+            get_form_field_types(form_definition), ["height", "age", "height"]
+        )
+
+        assert [(column.name, column.type) for column in columns] == [
+            (Name("height"), SqlType.double()),
+            (Name("age"), SqlType.big_int()),
+            (Name("height.1"), SqlType.double()),
+        ]
+
+    def test_get_form_columns_removed_group_names(self, form_definition):
+        columns = get_form_columns(
+            get_form_field_types(form_definition), ["height", "child_age"]
+        )
+
+        assert [column.type for column in columns] == [
+            SqlType.double(),
+            SqlType.big_int(),
+        ]
+
+    def test_form_schema_cache(self, form_definition):
+        cache = FormSchemaCache(fakeredis.FakeRedis())
+        form = {"formid": 1, "version": "202401011200", "hash": "md5:abc"}
+        field_types = get_form_field_types(form_definition)
+
+        assert cache.get(1, form) is None
+        cache.set(1, form, field_types)
+        assert cache.get(1, form) == field_types
+        # Entries are stored per server & export settings
+        assert cache.get(2, form) is None
+        assert cache.get(1, form, {"value_select_multiples": True}) is None
+        # Entries are invalidated once the form is modified
+        assert cache.get(1, {**form, "version": "202401021200"}) is None
+        assert cache.get(1, {**form, "hash": "md5:def"}) is None
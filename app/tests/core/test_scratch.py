@@ -0,0 +1,59 @@
+import pytest
+
+from app.core.exceptions import ScratchSpaceUnavailable
+from app.core.scratch import ScratchSpace
+
+
+class TestScratchSpace:
+    def test_job_files_are_removed(self, tmp_path):
+        space = ScratchSpace(root=str(tmp_path / "scratch"), max_bytes=1024)
+
+        with space.job("hyperfile-1") as scratch:
+            path = scratch.file_path(suffix=".csv")
+            path.write_text("_id\n1\n")
+            assert path.parent.name.startswith("hyperfile-1-")
+            assert space.usage() == 6
+        assert not path.exists()
+
+        # Files are removed when the job fails as well
+        with pytest.raises(ValueError):
+            with space.job("hyperfile-1") as scratch:
+                path = scratch.file_path(suffix=".csv")
+                path.write_text("_id\n1\n")
+                raise ValueError()
+        assert not path.exists()
+        assert space.usage() == 0
+
+    def test_jobs_wait_for_space(self, tmp_path):
+        space = ScratchSpace(
+            root=str(tmp_path / "scratch"),
+            max_bytes=5,
+            wait_timeout=0,
+            poll_interval=0,
+        )
+
+        with space.job("hyperfile-1") as scratch:
+            scratch.file_path(suffix=".csv").write_text("_id\n1\n")
+            # Jobs that already have files keep going
+            scratch.file_path(suffix=".csv")
+            with space.job("hyperfile-2") as other:
+                with pytest.raises(ScratchSpaceUnavailable):
+                    other.file_path(suffix=".csv")
+
+    def test_small_files_are_placed_on_tmpfs(self, tmp_path):
+        space = ScratchSpace(
+            root=str(tmp_path / "scratch"),
+            max_bytes=1024,
+            tmpfs_root=str(tmp_path / "tmpfs"),
+            tmpfs_max_file_bytes=10,
+        )
+
+        with space.job("hyperfile-1") as scratch:
+            small = scratch.file_path(suffix=".csv", size_hint=10)
+            large = scratch.file_path(suffix=".csv", size_hint=11)
+            unknown = scratch.file_path(suffix=".csv")
+
+        assert tmp_path / "tmpfs" in small.parents
+        assert tmp_path / "scratch" in large.parents
+        assert tmp_path / "scratch" in unknown.parents
+        assert not list((tmp_path / "tmpfs" / "duva").iterdir())
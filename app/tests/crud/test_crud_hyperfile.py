@@ -0,0 +1,29 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from app import crud
+
+
+class TestCRUDHyperFile:
+    @patch("app.crud.crud_hyperfile.TableauClient")
+    @patch("app.crud.crud_hyperfile.S3FileCache")
+    def test_sync_upstreams(self, mock_s3_cache, mock_tableau_client):
+        """
+        The local Hyper file is uploaded to S3 & published to Tableau
+        concurrently without being downloaded again
+        """
+        hyperfile = MagicMock(form_id=1, filename="export.hyper")
+        local_path = crud.hyperfile.get_local_path(obj=hyperfile)
+        # Both uploads have to be in progress at the same time to proceed
+        barrier = threading.Barrier(2, timeout=5)
+        mock_s3_cache().store.side_effect = lambda *args: barrier.wait()
+        mock_tableau_client().publish_hyper.side_effect = lambda *args: barrier.wait()
+
+        with patch.object(crud.hyperfile, "get_latest_file") as mock_get_latest_file:
+            crud.hyperfile.sync_upstreams(MagicMock(), obj=hyperfile)
+
+        mock_get_latest_file.assert_not_called()
+        mock_s3_cache().store.assert_called_once_with(
+            local_path, crud.hyperfile.get_file_path(obj=hyperfile)
+        )
+        mock_tableau_client().publish_hyper.assert_called_once_with(local_path)
@@ -0,0 +1,137 @@
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.libs.s3 import S3FileCache
+
+
+@pytest.fixture
+def s3_client():
+    s3_client = MagicMock()
+    s3_client.get_etag.return_value = '"v1"'
+    s3_client.download.side_effect = lambda path, file_name: (
+        Path(path).write_bytes(b"x" * 10) or True
+    )
+    s3_client.download_compressed.side_effect = s3_client.download.side_effect
+    s3_client.upload.return_value = True
+    s3_client.upload_compressed.return_value = True
+    return s3_client
+
+
+class TestS3FileCache:
+    def test_fetch_uses_current_cached_copy(self, tmp_path, s3_client):
+        cache = S3FileCache(root=str(tmp_path), max_bytes=100, s3_client=s3_client)
+        local_path = str(tmp_path / "1_form.hyper")
+
+        assert cache.fetch("1/bob/1_form.hyper", local_path)
+        assert cache.fetch("1/bob/1_form.hyper", local_path)
+        assert s3_client.download.call_count == 1
+
+        # Stale copies are downloaded again
+        s3_client.get_etag.return_value = '"v2"'
+        assert cache.fetch("1/bob/1_form.hyper", local_path)
+        assert s3_client.download.call_count == 2
+
+        # Copies modified locally since they were synced aren't used
+        Path(local_path).write_bytes(b"modified")
+        os.utime(local_path, ns=(0, 0))
+        assert cache.fetch("1/bob/1_form.hyper", local_path)
+        assert s3_client.download.call_count == 3
+
+        # Missing S3 objects aren't available
+        s3_client.get_etag.return_value = None
+        assert not cache.fetch("1/bob/1_form.hyper", local_path)
+
+    def test_store(self, tmp_path, s3_client):
+        cache = S3FileCache(root=str(tmp_path), max_bytes=100, s3_client=s3_client)
+        local_path = str(tmp_path / "1_form.hyper")
+        Path(local_path).write_bytes(b"built")
+
+        assert cache.store(local_path, "1/bob/1_form.hyper")
+        assert cache.fetch("1/bob/1_form.hyper", local_path)
+        s3_client.download.assert_not_called()
+
+    def test_store_removes_stale_compressed_copies(self, tmp_path, s3_client):
+        """
+        Compressed copies that would be fetched instead of the stored file
+        are removed
+        """
+        cache = S3FileCache(root=str(tmp_path), max_bytes=100, s3_client=s3_client)
+        local_path = str(tmp_path / "1_form.hyper")
+        Path(local_path).write_bytes(b"built")
+
+        assert cache.store(local_path, "1_form.hyper")
+        s3_client.delete.assert_called_once_with("1_form.hyper.zst")
+        s3_client.upload_compressed.assert_not_called()
+
+        s3_client.delete.return_value = False
+        assert not cache.store(local_path, "1_form.hyper")
+        assert cache._get_cached_etag(local_path) is None
+
+        with patch("app.libs.s3.cache.settings.S3_COMPRESS_HYPER_FILES", True):
+            pytest.importorskip("zstandard")
+            s3_client.upload_compressed.return_value = False
+            assert not cache.store(local_path, "1_form.hyper")
+        s3_client.delete.assert_called_with("1_form.hyper.zst")
+        assert s3_client.delete.call_count == 3
+
+    def test_evicts_least_recently_used_files(self, tmp_path, s3_client):
+        cache = S3FileCache(root=str(tmp_path), max_bytes=25, s3_client=s3_client)
+        paths = [str(tmp_path / f"{i}_form.hyper") for i in range(3)]
+
+        cache.fetch("0_form.hyper", paths[0])
+        cache.fetch("1_form.hyper", paths[1])
+        for index, path in enumerate(paths[:2]):
+            os.utime(path, (index, index))
+            os.utime(cache._etag_path(path), (index, index))
+        # Using the oldest file makes it the most recently used
+        cache.fetch("0_form.hyper", paths[0])
+        cache.fetch("2_form.hyper", paths[2])
+
+        assert [os.path.exists(path) for path in paths] == [True, False, True]
+        assert not cache._etag_path(paths[1]).exists()
+
+    def test_rebuilt_files_are_recently_used(self, tmp_path, s3_client):
+        cache = S3FileCache(root=str(tmp_path), max_bytes=25, s3_client=s3_client)
+        paths = [str(tmp_path / f"{i}_form.hyper") for i in range(3)]
+        cache.fetch("0_form.hyper", paths[0])
+        cache.fetch("1_form.hyper", paths[1])
+        os.utime(paths[1], (1, 1))
+        os.utime(cache._etag_path(paths[1]), (1, 1))
+
+        # Re-building a file doesn't touch its ETag file
+        os.utime(cache._etag_path(paths[0]), (0, 0))
+        Path(paths[0]).write_bytes(b"y" * 10)
+        cache.fetch("2_form.hyper", paths[2])
+
+        assert [os.path.exists(path) for path in paths] == [True, False, True]
+
+    @patch("app.libs.s3.cache.settings.S3_COMPRESS_HYPER_FILES", True)
+    def test_compressed_copies(self, tmp_path, s3_client):
+        pytest.importorskip("zstandard")
+        cache = S3FileCache(root=str(tmp_path), max_bytes=100, s3_client=s3_client)
+        local_path = str(tmp_path / "1_form.hyper")
+        Path(local_path).write_bytes(b"built")
+
+        # The uncompressed file is kept for download links
+        assert cache.store(local_path, "1_form.hyper")
+        s3_client.upload.assert_called_once_with(local_path, "1_form.hyper")
+        s3_client.upload_compressed.assert_called_once_with(
+            local_path, "1_form.hyper.zst"
+        )
+
+        cache.remove(local_path)
+        assert cache.fetch("1_form.hyper", local_path)
+        s3_client.download_compressed.assert_called_once_with(
+            local_path, "1_form.hyper.zst"
+        )
+        s3_client.download.assert_not_called()
+
+        # Files without a compressed copy are fetched uncompressed
+        s3_client.get_etag.side_effect = lambda name: (
+            None if name.endswith(".zst") else '"v2"'
+        )
+        assert cache.fetch("1_form.hyper", local_path)
+        s3_client.download.assert_called_once_with(local_path, "1_form.hyper")
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+
+from app.libs.s3 import S3Client
+from app.libs.s3.client import S3_TRANSFERRED_BYTES, get_s3_resource
+
+
+class TestS3Client:
+    def test_compressed_transfers(self, tmp_path):
+        """
+        Files uploaded compressed are downloaded as they were
+        """
+        pytest.importorskip("zstandard")
+        objects = {}
+        s3 = MagicMock()
+        s3.meta.client.upload_fileobj.side_effect = (
+            lambda f, bucket, key, **kwargs: objects.update({key: f.read()})
+        )
+        s3.meta.client.download_fileobj.side_effect = (
+            lambda bucket, key, f, **kwargs: f.write(objects[key])
+        )
+        path = tmp_path / "form.hyper"
+        path.write_bytes(b"hyper" * 1000)
+
+        with patch("app.libs.s3.S3Client.s3", new_callable=PropertyMock) as s3_mock:
+            s3_mock.return_value = s3
+            client = S3Client()
+            assert client.upload_compressed(str(path), "form.hyper.zst")
+            assert len(objects["form.hyper.zst"]) < 5000
+
+            downloaded = tmp_path / "downloaded.hyper"
+            assert client.download_compressed(str(downloaded), "form.hyper.zst")
+            assert downloaded.read_bytes() == path.read_bytes()
+
+            # Corrupt objects leave no partial file behind
+            objects["form.hyper.zst"] = b"corrupt"
+            downloaded.unlink()
+            assert not client.download_compressed(str(downloaded), "form.hyper.zst")
+            assert list(tmp_path.iterdir()) == [path]
+
+    def test_transfers_are_tuned_tracked_and_checksummed(self, tmp_path):
+        s3 = MagicMock()
+        s3.meta.client.upload_file.side_effect = (
+            lambda path, bucket, key, Callback, **kwargs: Callback(1024)
+        )
+        uploaded = S3_TRANSFERRED_BYTES.labels("upload")._value.get()
+
+        with patch(
+            "app.libs.s3.S3Client.s3", new_callable=PropertyMock
+        ) as s3_mock, patch.multiple(
+            "app.libs.s3.client.settings",
+            S3_TRANSFER_CHUNK_SIZE=32 * 1024 * 1024,
+            S3_TRANSFER_MAX_CONCURRENCY=4,
+            S3_CHECKSUM_ALGORITHM="SHA256",
+        ):
+            s3_mock.return_value = s3
+            assert S3Client().upload(str(tmp_path / "form.hyper"), "form.hyper")
+
+        kwargs = s3.meta.client.upload_file.call_args.kwargs
+        assert kwargs["ExtraArgs"] == {"ChecksumAlgorithm": "SHA256"}
+        assert kwargs["Config"].multipart_chunksize == 32 * 1024 * 1024
+        assert kwargs["Config"].max_concurrency == 4
+        assert S3_TRANSFERRED_BYTES.labels("upload")._value.get() == uploaded + 1024
+
+    def test_s3_resource_per_thread(self):
+        with patch("app.libs.s3.client._local", threading.local()), patch(
+            "app.libs.s3.client.boto3.session.Session"
+        ) as session:
+            session.side_effect = lambda: MagicMock()
+            resource = get_s3_resource()
+            assert get_s3_resource() is resource
+            with ThreadPoolExecutor(1) as executor:
+                assert executor.submit(get_s3_resource).result() is not resource
@@ -8,17 +8,14 @@ from pathlib import Path
 from tempfile import NamedTemporaryFile
 from typing import Optional
 
-import httpx
-from fastapi_cache import caches
 from prometheus_client import Counter, Gauge
 from redis import Redis
 from redis.exceptions import LockError
 from sqlalchemy.orm.session import Session
-from tableauhyperapi import HyperProcess, Telemetry
+from tableauhyperapi import HyperProcess
 
 from app import schemas
 from app.common_tags import (
-    HYPER_PROCESS_CACHE_KEY,
     HYPERFILE_SYNC_LOCK_PREFIX,
     JOB_ID_METADATA,
     ONADATA_FORMS_ENDPOINT,
@@ -26,6 +23,8 @@ from app.common_tags import (
 )
 from app import crud
 from app.core.config import settings
+from app.core.http_clients import get_download_client, get_session
+from app.core.hyper_pool import get_hyper_process_pool
 from app.database.session import SessionLocal
 from app.models import HyperFile, Server, User
 from app.utils.hyper_utils import (
@@ -70,7 +69,7 @@ def get_access_token(user: User, server: Server, db: SessionLocal) -> Optional[s
         "refresh_token": user.decrypt_value(user.refresh_token),
         "client_id": server.client_id,
     }
-    resp = httpx.post(
+    resp = get_session(server.url).post(
         url,
         data=data,
         auth=(server.client_id, server.decrypt_value(server.client_secret)),
@@ -84,12 +83,14 @@ def get_access_token(user: User, server: Server, db: SessionLocal) -> Optional[s
     return None
 
 
-def write_export_to_temp_file(export_url, client, retry: int = 0):
+def write_export_to_temp_file(
+    export_url, client, retry: int = 0, headers: Optional[dict] = None
+):
     print("Writing to temporary CSV Export to temporary file.")
     retry = 0 or retry
     status = 0
     with NamedTemporaryFile(delete=False, suffix=".csv") as export:
-        with client.stream("GET", export_url) as response:
+        with client.stream("GET", export_url, headers=headers) as response:
             if response.status_code == 200:
                 for chunk in response.iter_bytes():
                     export.write(chunk)
@@ -99,21 +100,27 @@ def write_export_to_temp_file(export_url, client, retry: int = 0):
         print(
             f"Retrying export write: Status {status}, Retry {retry}, URL {export_url}"
         )
-        write_export_to_temp_file(export_url=export_url, client=client, retry=retry + 1)
+        write_export_to_temp_file(
+            export_url=export_url, client=client, retry=retry + 1, headers=headers
+        )
 
 
 def _get_csv_export(
-    url: str, client, retries: int = 0, sleep_when_in_progress: bool = True
+    url: str,
+    client,
+    retries: int = 0,
+    sleep_when_in_progress: bool = True,
+    headers: Optional[dict] = None,
 ):
     print("Checking on export status.")
-    resp = client.get(url)
+    resp = client.get(url, headers=headers)
 
     if resp.status_code == 202:
         resp = resp.json()
         job_status = resp.get("job_status")
         if "export_url" in resp and job_status == "SUCCESS":
             export_url = resp.get("export_url")
-            return write_export_to_temp_file(export_url, client)
+            return write_export_to_temp_file(export_url, client, headers=headers)
         elif job_status == "FAILURE":
             reason = resp.get("progress")
             raise CSVExportFailure(f"CSV Export Failure. Reason: {reason}")
@@ -131,6 +138,7 @@ def _get_csv_export(
                 client,
                 retries=retries + 1,
                 sleep_when_in_progress=sleep_when_in_progress,
+                headers=headers,
             )
         else:
             raise ConnectionRequestError(
@@ -156,22 +164,22 @@ def get_csv_export(
         "user-agent": f"{settings.APP_NAME}/{settings.APP_VERSION}",
         "Authorization": f"Bearer {bearer_token}",
     }
-    with httpx.Client(headers=headers) as client:
-        form_url = f"{server.url}{ONADATA_FORMS_ENDPOINT}/{hyperfile.form_id}"
-        resp = client.get(form_url + ".json")
-        if resp.status_code == 200:
-            url = f"{form_url}/export_async.json?format=csv"
-            if hyperfile.configuration:
-                export_settings = schemas.ExportConfigurationSettings(
-                    **hyperfile.configuration.export_settings
-                ).dict()
+    client = get_download_client(server.url)
+    form_url = f"{server.url}{ONADATA_FORMS_ENDPOINT}/{hyperfile.form_id}"
+    resp = client.get(form_url + ".json", headers=headers)
+    if resp.status_code == 200:
+        url = f"{form_url}/export_async.json?format=csv"
+        if hyperfile.configuration:
+            export_settings = schemas.ExportConfigurationSettings(
+                **hyperfile.configuration.export_settings
+            ).dict()
 
-                for key, value in export_settings.items():
-                    url += f"&{key}={value}"
+            for key, value in export_settings.items():
+                url += f"&{key}={value}"
 
-            csv_export = _get_csv_export(url, client)
-            if csv_export:
-                return Path(csv_export.name)
+        csv_export = _get_csv_export(url, client, headers=headers)
+        if csv_export:
+            return Path(csv_export.name)
 
 
 @IN_PROGRESS_HYPER_IMPORT.track_inprogress()
@@ -253,13 +261,8 @@ def start_csv_import_to_hyper(
 
 
 def start_csv_import_to_hyper_job(hyperfile_id: int, schedule_cron: bool = False):
-    if not caches.get(HYPER_PROCESS_CACHE_KEY):
-        caches.set(
-            HYPER_PROCESS_CACHE_KEY,
-            HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU),
-        )
-    process: HyperProcess = caches.get(HYPER_PROCESS_CACHE_KEY)
-    start_csv_import_to_hyper(hyperfile_id, process, schedule_cron=schedule_cron)
+    with get_hyper_process_pool().lease() as process:
+        start_csv_import_to_hyper(hyperfile_id, process, schedule_cron=schedule_cron)
 
 
 def create_or_get_hyperfile(
@@ -276,7 +279,7 @@ def create_or_get_hyperfile(
     headers.update({"Authorization": f"Bearer {bearer_token}"})
 
     url = f"{server.url}{ONADATA_FORMS_ENDPOINT}/{file_data.form_id}.json"
-    resp = httpx.get(url, headers=headers)
+    resp = get_session(server.url).get(url, headers=headers)
 
     if resp.status_code == 200:
         resp = resp.json()